@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import os
+import typing
 
 dir_name = os.path.dirname(__file__)
 father_dir_name = os.path.dirname(dir_name)
@@ -7,16 +8,94 @@ env_path = os.path.join(father_dir_name, ".env")
 
 
 class Settings(BaseSettings):
-    # SMTP_SERVER: str
-    # SMTP_PORT: int = 465
-    # SMTP_USER: str
-    # SMTP_PASSWORD: str
+    # 邮件发送方式: 'outlook'(仅 Windows，其他系统上发送时失败) | 'smtp' | 'maildir' | 'memory'
+    MAIL_TRANSPORT: str = "outlook"
+
+    SMTP_SERVER: typing.Optional[str] = None
+    SMTP_PORT: int = 465
+    SMTP_USER: typing.Optional[str] = None
+    SMTP_PASSWORD: typing.Optional[str] = None
+    # 发件人，未配置时使用 SMTP_USER
+    SMTP_SENDER: typing.Optional[str] = None
+    # 465 端口使用 SSL; 587 端口关闭 SMTP_USE_TLS, 开启 SMTP_START_TLS
+    SMTP_USE_TLS: bool = True
+    SMTP_START_TLS: bool = False
+    # SMTP 长连接数量
+    SMTP_POOL_SIZE: int = 4
+
+    # 待发送邮件: 发送间隔(秒), 每批数量, 最多尝试次数, 第一次重试等待(秒), 已发送邮件保留天数
+    OUTBOX_INTERVAL_SECONDS: int = 5
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_RETRY_SECONDS: int = 60
+    OUTBOX_KEEP_DAYS: int = 7
+
+    # bcrypt 线程数和最多排队数量，排队已满时登录/注册返回 503
+    PWD_HASH_WORKERS: int = 2
+    PWD_HASH_MAX_PENDING: int = 32
+
+    # 单个任务: 'eager' 预先生成未来一年的任务 | 'lazy' 查询时按规则计算，只保存已完成/有备注的任务
+    SINGLE_TASK_MODE: str = "eager"
+    # 创建任务时同步生成的天数，其余由后台 worker 生成: 同步天数, worker 数量, 队列长度
+    GENERATE_EAGER_DAYS: int = 7
+    GENERATE_WORKERS: int = 2
+    GENERATE_QUEUE_SIZE: int = 10000
+
+    # 批量导入: 上传文件最大字节数, 每批写入行数, 最多记录的失败行数
+    IMPORT_MAX_BYTES: int = 50 * 1024 * 1024
+    IMPORT_CHUNK_SIZE: int = 500
+    IMPORT_MAX_ERRORS: int = 1000
+    # 导入任务超过此时间(秒)未更新进度，视为导入进程已退出，标记为失败
+    IMPORT_STALE_SECONDS: int = 600
+
+    # 定时任务租约: 有效期(秒), 续约间隔(秒)；多个进程中只有持有租约的进程执行定时任务
+    SCHEDULER_LEASE_SECONDS: int = 30
+    SCHEDULER_LEASE_RENEW_SECONDS: int = 10
+    # 提醒定时器: 从数据库重新加载即将到期提醒的间隔(秒)，用于同步其他进程修改的任务
+    REMIND_RESYNC_SECONDS: int = 60
+    # 提醒定时器: 查询其他进程新增的即将到期提醒的间隔(秒)，其他进程创建的任务最迟在此间隔后加入定时器
+    REMIND_POLL_SECONDS: int = 5
+
+    # web 进程中运行邮件发送和定时任务；设为 False 时 web 只写入待发送邮件，由 python -m app.worker 处理
+    WEB_RUN_WORKER: bool = True
+    # 提醒由 python -m app.run_worker --shard i/n 分片处理，web / app.worker 不再处理提醒
+    REMIND_SHARDED: bool = False
+
+    # session 存储: 'memory' 单进程 | 'database' 多个 worker 进程共享
+    SESSION_BACKEND: str = "memory"
+    # session 过期时间(分钟)，每次访问后重新计时
+    SESSION_EXPIRE_MINUTES: int = 30
+    # 清理过期 session 的间隔(秒)
+    SESSION_SWEEP_SECONDS: int = 60
+    # memory 方式最多保存的 session 数量
+    SESSION_MAX_SIZE: int = 100000
+
+    # maildir 方式的邮件保存目录
+    MAILDIR_PATH: str = "maildir"
 
     SQL_HOST: str
     SQL_PORT: int = 3306
     SQL_USER: str
     SQL_PASSWORD: str
     SQL_DATABASE: str
+    # 连接池: 最小/最大连接数, 连接空闲多久后重建(秒，小于 MySQL wait_timeout，-1 不重建)
+    SQL_POOL_MINSIZE: int = 1
+    SQL_POOL_MAXSIZE: int = 10
+    SQL_POOL_RECYCLE: int = 3600
+    # aiomysql 输出每条 SQL，只在调试时开启
+    SQL_ECHO: bool = False
+    # tortoise / aiomysql 日志级别，DEBUG 时记录每条 SQL
+    SQL_LOG_LEVEL: str = "WARNING"
+    # 只读副本，未配置 SQL_REPLICA_HOST 时列表查询也使用主库；端口、用户、密码未配置时与主库相同
+    SQL_REPLICA_HOST: typing.Optional[str] = None
+    SQL_REPLICA_PORT: typing.Optional[int] = None
+    SQL_REPLICA_USER: typing.Optional[str] = None
+    SQL_REPLICA_PASSWORD: typing.Optional[str] = None
+
+    # 邮件发送 worker 数量
+    MAIL_WORKERS: int = 4
+    # 邮件队列长度，队列满时提醒任务等待
+    MAIL_QUEUE_SIZE: int = 1000
 
     model_config = SettingsConfigDict(env_file=env_path)
 
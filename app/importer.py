@@ -0,0 +1,185 @@
+"""
+批量导入任务
+
+上传的文件先写入临时文件(不在内存中保存整个文件)，再由后台逐行读取，
+每行按 TaskIn 校验后分批写入 ScheduledTask 和名称分词，每批写入后生成该批任务的单个任务实例并更新进度
+
+CSV 第一行为表头，列名与 TaskIn 的字段相同，advance_days 写成 "1,2,7"；
+NDJSON 每行一个 TaskIn 结构的 JSON 对象
+"""
+import os
+import csv
+import json
+import typing
+import datetime
+import tempfile
+import logging
+import pydantic
+from tortoise.transactions import in_transaction
+from app.models.models import ScheduledTask, SingleTask, TaskNameGram, ImportJob
+from app.tasks import TaskIn, build_scheduled_task
+from app.env import settings
+from app.models.mysql_config import DEFAULT_CONNECTION
+from app.worker.fresher import GENERATE_DAYS_AHEAD, BULK_CREATE_BATCH_SIZE
+from app import ulity, name_search
+
+_logger = logging.getLogger(__name__)
+
+# 支持的格式
+IMPORT_FORMATS = ("csv", "ndjson")
+
+
+class ImportTooLarge(Exception):
+    pass
+
+
+def guess_format(content_type: typing.Optional[str]) -> typing.Optional[str]:
+    """根据 Content-Type 判断格式"""
+    content_type = (content_type or "").lower()
+    if "csv" in content_type:
+        return "csv"
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    return None
+
+
+async def spool(stream: typing.AsyncIterator[bytes], max_bytes: int) -> str:
+    """
+    将上传内容逐块写入临时文件
+    :return: 临时文件路径，由调用方删除
+    :raise ImportTooLarge: 超过 max_bytes
+    """
+    fd, path = tempfile.mkstemp(prefix="task_import_")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in stream:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ImportTooLarge(f"upload exceeds {max_bytes} bytes")
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def _csv_row(row: dict) -> dict:
+    """CSV 的一行转换为 TaskIn 的输入，空单元格使用默认值"""
+    data = {key.strip(): value.strip() for key, value in row.items() if key and value is not None and value.strip()}
+    if "advance_days" in data:
+        days = data["advance_days"].strip("[]").replace(";", ",")
+        data["advance_days"] = [day.strip() for day in days.split(",") if day.strip()]
+    return data
+
+
+def iter_rows(path: str, fmt: str) -> typing.Iterator[tuple[int, typing.Any]]:
+    """
+    逐行读取文件
+    :return: (行号, 该行数据)，解析失败时数据为 Exception
+    """
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            try:
+                for row in reader:
+                    yield reader.line_num, _csv_row(row)
+            except csv.Error as err:
+                yield reader.line_num, err
+        else:
+            for line_num, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_num, json.loads(line)
+                except ValueError as err:
+                    yield line_num, err
+
+
+def _error_message(err: Exception) -> str:
+    if isinstance(err, pydantic.ValidationError):
+        messages = list()
+        for e in err.errors():
+            loc = ".".join(str(loc) for loc in e["loc"])
+            messages.append(f"{loc}: {e['msg']}" if loc else e["msg"])
+        return "; ".join(messages)
+    return str(err)
+
+
+async def _write_chunk(user_id: int, tasks: list[ScheduledTask], on_created=None):
+    """写入一批任务和名称分词，再生成单个任务实例"""
+    # MySQL 批量插入不返回自增 id，分词和单个任务需要 id，在同一事务中逐个插入
+    async with in_transaction(DEFAULT_CONNECTION) as conn:
+        for task in tasks:
+            await task.save(using_db=conn)
+        grams = [gram for task in tasks for gram in name_search.build_grams(task.id, user_id, task.name)]
+        if grams:
+            await TaskNameGram.bulk_create(grams, using_db=conn)
+
+    if on_created is not None:
+        for task in tasks:
+            on_created(task)
+
+    # 生成单个任务实例，按需计算模式下查询时再计算
+    if settings.SINGLE_TASK_MODE == "eager":
+        enable_dt = ulity.now() + datetime.timedelta(days=GENERATE_DAYS_AHEAD)
+        single_tasks = [single_task for task in tasks for single_task in task.build_single_tasks(enable_dt)]
+        if single_tasks:
+            async with in_transaction(DEFAULT_CONNECTION):
+                await SingleTask.bulk_create(single_tasks, batch_size=BULK_CREATE_BATCH_SIZE, ignore_conflicts=True)
+
+
+async def run_import(
+        job_id: int,
+        user_id: int,
+        path: str,
+        fmt: str,
+        on_created: typing.Optional[typing.Callable[[ScheduledTask], typing.Any]] = None,
+):
+    """
+    后台执行导入，每批写入后更新进度和 updated_at，结束后删除临时文件
+    进程退出导致长时间未更新的导入任务由 fresher.fail_stale_import_jobs 标记为失败
+    :param on_created: 每个任务写入后调用，用于加入提醒定时器
+    """
+    chunk_size = settings.IMPORT_CHUNK_SIZE
+    max_errors = settings.IMPORT_MAX_ERRORS
+    total, imported, failed, errors = 0, 0, 0, list()
+    job = ImportJob.filter(id=job_id)
+    try:
+        await job.update(status="running", updated_at=ulity.now())
+        tasks = list()
+        for line_num, data in iter_rows(path, fmt):
+            total += 1
+            try:
+                if isinstance(data, Exception):
+                    raise data
+                tasks.append(build_scheduled_task(TaskIn.model_validate(data), user_id))
+            except (pydantic.ValidationError, ValueError, TypeError, csv.Error) as err:
+                failed += 1
+                if len(errors) < max_errors:
+                    errors.append({"line": line_num, "error": _error_message(err)})
+
+            if len(tasks) >= chunk_size:
+                await _write_chunk(user_id, tasks, on_created)
+                imported += len(tasks)
+                tasks = list()
+                await job.update(
+                    total=total, imported=imported, failed=failed, errors=errors, updated_at=ulity.now(),
+                )
+
+        if tasks:
+            await _write_chunk(user_id, tasks, on_created)
+            imported += len(tasks)
+        await job.update(
+            status="done", total=total, imported=imported, failed=failed, errors=errors,
+            finished_at=ulity.now(), updated_at=ulity.now(),
+        )
+    except Exception as err:
+        _logger.exception(f"import job[{job_id}] error: {err}")
+        errors.append({"line": None, "error": str(err)})
+        await job.update(
+            status="failed", total=total, imported=imported, failed=failed, errors=errors,
+            finished_at=ulity.now(), updated_at=ulity.now(),
+        )
+    finally:
+        os.remove(path)
@@ -0,0 +1,188 @@
+"""
+按需计算的单个任务 (SINGLE_TASK_MODE=lazy)
+
+不再预先生成 SingleTask，查询时根据 ScheduledTask 的时间规则计算请求范围内的任务，
+只有带状态(已完成、备注)的任务才写入 SingleTask，作为覆盖行在查询时合并
+单个任务以 (task_id, done_times) 标识，done_times 为第几次任务，从 1 开始
+"""
+import heapq
+import typing
+import datetime
+from tortoise.expressions import Q
+from tortoise.exceptions import IntegrityError
+from tortoise.backends.base.client import BaseDBAsyncClient
+from app.models.models import ScheduledTask, SingleTask
+from app.occurrence import Recurrence, wall_clock
+from app import pagination
+
+# 计算任务时间需要的字段
+RULE_FIELDS = (
+    "id", "name", "message", "start_datetime", "repeat_type", "repeat_interval", "repeat_times",
+    "is_ended", "ended_at",
+)
+# 覆盖行的字段，与 routers/single_tasks.py 的查询结果一致
+OVERRIDE_FIELDS = ("id", "datetime", "done_times", "repeat_times", "remark", "is_done", "task_id")
+
+_EPSILON = datetime.timedelta(microseconds=1)
+
+
+def occurrence_limit(task: dict) -> typing.Optional[int]:
+    """任务总次数，None 表示无限"""
+    if task["repeat_interval"] < 0:
+        return 1
+    if task["repeat_times"] > 0:
+        return task["repeat_times"]
+    return None
+
+
+def iter_occurrences(
+        task: dict,
+        window_start: datetime.datetime,
+        until: datetime.datetime,
+) -> typing.Iterator[tuple[datetime.datetime, int, int, datetime.datetime]]:
+    """
+    逐个计算 [window_start, until] 内的任务时间
+    :param task: RULE_FIELDS 对应的字典
+    :param window_start: 起始时间(包含)，不带时区的墙上时间
+    :param until: 截止时间(包含)，不带时区的墙上时间
+    :return: (墙上时间, task_id, done_times, 任务时间)
+    """
+    recurrence = Recurrence(task["start_datetime"], task["repeat_type"], task["repeat_interval"])
+    tzinfo = task["start_datetime"].tzinfo
+    # 结束的任务只计算到结束时间
+    if task["is_ended"] and task["ended_at"] is not None:
+        until = min(until, wall_clock(task["ended_at"], tzinfo))
+
+    k = recurrence.index_after(window_start - _EPSILON)
+    if k is None:
+        return
+    limit = occurrence_limit(task)
+    while limit is None or k < limit:
+        dt = recurrence.nth(k)
+        if dt is None:
+            return
+        wall_dt = wall_clock(dt, tzinfo)
+        if wall_dt > until:
+            return
+        yield wall_dt, task["id"], k + 1, dt
+        k += 1
+
+
+def virtual_row(task: dict, done_times: int, dt: datetime.datetime) -> dict:
+    """未写入数据库的单个任务，结构与覆盖行一致"""
+    return {
+        "id": None,
+        "datetime": dt,
+        "done_times": done_times,
+        "repeat_times": task["repeat_times"],
+        "remark": None,
+        "is_done": False,
+        "task_id": task["id"],
+    }
+
+
+async def fetch_page(
+        user_id: int,
+        start_dt: datetime.datetime,
+        end_dt: datetime.datetime,
+        limit: int,
+        cursor: typing.Optional[str] = None,
+        is_done: typing.Optional[bool] = None,
+        task_ids: typing.Optional[list[int]] = None,
+        using_db: typing.Optional[BaseDBAsyncClient] = None,
+) -> tuple[list[dict], typing.Optional[str]]:
+    """
+    按 (datetime, task_id) 分页计算一页单个任务
+    :param start_dt: 起始时间(包含)，不带时区
+    :param end_dt: 截止时间(不包含)，不带时区
+    :param task_ids: 只查询这些任务，None 表示全部
+    :param using_db: 查询使用的连接，None 表示默认连接
+    :return: (本页数据, 下一页游标)，行的结构与 SingleTask 查询结果一致
+    """
+    window_start, after = start_dt, None
+    if cursor:
+        cursor_dt, cursor_task_id = pagination.decode_cursor(cursor)
+        cursor_dt = wall_clock(cursor_dt, pagination.DB_TZINFO)
+        window_start, after = max(start_dt, cursor_dt), (cursor_dt, cursor_task_id)
+    until = end_dt - _EPSILON
+
+    query = ScheduledTask.filter(
+        Q(is_ended=False) | Q(ended_at__gte=window_start),
+        user_id=user_id,
+        start_datetime__lt=end_dt,
+    ).using_db(using_db)
+    if task_ids is not None:
+        query = query.filter(id__in=task_ids)
+    tasks = {task["id"]: task for task in await query.values(*RULE_FIELDS)}
+    if not tasks:
+        return list(), None
+
+    # 范围内带状态的任务
+    overrides = await SingleTask.filter(
+        user_id=user_id,
+        task_id__in=list(tasks),
+        datetime__gte=window_start,
+        datetime__lt=end_dt,
+    ).using_db(using_db).values(*OVERRIDE_FIELDS)
+    overrides = {(row["task_id"], row["done_times"]): row for row in overrides}
+
+    # 按时间合并所有任务，只计算到本页需要的位置
+    merged = heapq.merge(*(iter_occurrences(task, window_start, until) for task in tasks.values()))
+    rows, last = list(), None
+    for wall_dt, task_id, done_times, dt in merged:
+        if after is not None and (wall_dt, task_id) <= after:
+            continue
+        task = tasks[task_id]
+        row = overrides.get((task_id, done_times)) or virtual_row(task, done_times, dt)
+        if is_done is not None and row["is_done"] != is_done:
+            continue
+        if len(rows) == limit:
+            return rows, pagination.encode_cursor(last[0], last[1])
+        row["task_name"], row["task_message"] = task["name"], task["message"]
+        rows.append(row)
+        last = (dt, task_id)
+    return rows, None
+
+
+async def iter_pages(*args, **kwargs) -> typing.AsyncIterator[list[dict]]:
+    """从游标位置开始逐页计算，参数与 fetch_page 相同"""
+    kwargs = dict(kwargs)
+    while True:
+        rows, cursor = await fetch_page(*args, **kwargs)
+        if rows:
+            yield rows
+        if cursor is None:
+            break
+        kwargs["cursor"] = cursor
+
+
+async def materialize(user_id: int, task_id: int, done_times: int) -> typing.Optional[SingleTask]:
+    """
+    将第 done_times 次任务写入数据库，已存在则直接返回
+    任务不存在或超出任务次数返回 None
+    """
+    single_task = await SingleTask.get_or_none(task_id=task_id, user_id=user_id, done_times=done_times)
+    if single_task:
+        return single_task
+
+    task = await ScheduledTask.filter(id=task_id, user_id=user_id).first().values(*RULE_FIELDS)
+    if not task or done_times < 1:
+        return None
+    limit = occurrence_limit(task)
+    if limit is not None and done_times > limit:
+        return None
+    dt = Recurrence(task["start_datetime"], task["repeat_type"], task["repeat_interval"]).nth(done_times - 1)
+    if dt is None:
+        return None
+    try:
+        return await SingleTask.create(
+            user_id=user_id,
+            task_id=task_id,
+            datetime=dt,
+            done_times=done_times,
+            repeat_times=task["repeat_times"],
+            is_done=False,
+        )
+    except IntegrityError:
+        # 并发的请求已经写入
+        return await SingleTask.get_or_none(task_id=task_id, user_id=user_id, done_times=done_times)
@@ -0,0 +1,55 @@
+"""
+提醒邮件的内容，web 接口和后台 worker 共用，不依赖 FastAPI
+"""
+import datetime
+import typing
+from pydantic import BaseModel, EmailStr
+
+
+class MailInfo(BaseModel):
+    to: typing.Union[EmailStr, list[EmailStr]]
+    cc: typing.Union[EmailStr, list[EmailStr], None] = None
+    sender: typing.Union[EmailStr, None] = None
+    subject: str
+    username: str
+    task_name: str
+    message: str
+    task_datetime: datetime.datetime
+    task_done: int
+    repeat_type: str
+    note: str
+    local_image_path: typing.Optional[str] = None
+
+def format_mail_task(mail_info: MailInfo) -> dict:
+    '''
+    to:
+    cc:
+    sender:
+    subject: 邮件主题
+    context: 邮件内容字典
+        "username": task.user.username,
+        "task_name": task.task_name,
+        "message": task.message,
+        "task_datetime": dt,
+        "task_done": task.current_repeat_done,
+        "repeat_type": repeat_type,
+        "note": "正式提醒"
+    local_image_path:
+    '''
+    task = {
+        "to": mail_info.to,
+        "cc": mail_info.cc,
+        "sender": mail_info.sender,
+        "subject": mail_info.subject,
+        "context": {
+            "username": mail_info.username,
+            "task_name": mail_info.task_name,
+            "message": mail_info.message,
+            "task_datetime": mail_info.task_datetime.strftime("%Y-%m-%d %H:%M"),
+            "task_done": mail_info.task_done,
+            "repeat_type": mail_info.repeat_type,
+            "note": mail_info.note,
+        },
+        "local_image_path": mail_info.local_image_path,
+    }
+    return task
@@ -4,58 +4,37 @@ from fastapi.responses import RedirectResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from tortoise.contrib.fastapi import register_tortoise
-from apscheduler.triggers.cron import CronTrigger
-from apscheduler.triggers.interval import IntervalTrigger
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from pathlib import Path
 from .models.mysql_config import MYSQL_TORTOISE_ORM
-from .routers import login, register, user, new_task, single_tasks, scheduled_tasks, index, mail
-from . import ulity, auth
-from .worker.mail_sender import MailSender
-from .worker import fresher
-
-# 定时器
-scheduler = AsyncIOScheduler()
-
-def scheduler_do(app: FastAPI):
-    # 每分钟执行
-    scheduler.add_job(
-        func=fresher.fresh_email_remind,
-        kwargs={"app": app},
-        trigger=IntervalTrigger(minutes=1),
-        name="fresh_email_remind",
-        misfire_grace_time=30,
-        coalesce=True,
-        max_instances=5,
-        next_run_time=ulity.now(),
-    )
-
-    # 每天04:00:00执行
-    scheduler.add_job(
-        func=fresher.fresh_single_tasks,
-        trigger=CronTrigger(hour=4, minute=0, second=0),
-        name="fresh_single_tasks",
-        misfire_grace_time=60,
-        coalesce=True,
-        max_instances=1,
-        next_run_time=ulity.now(),
-    )
-
-    scheduler.start()
+from .env import settings
+from .routers import login, register, user, new_task, single_tasks, scheduled_tasks, index, mail, task_import
+from . import auth, pagination
+from .worker.service import WorkerService
+from .worker.generator import SingleTaskGenerator
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.mail_sender = MailSender()
-    await app.state.mail_sender.start()
-
-    scheduler_do(app)
+    await auth.session_store.start()
+    # 后台生成单个任务实例
+    app.state.generator = SingleTaskGenerator(
+        workers=settings.GENERATE_WORKERS,
+        queue_size=settings.GENERATE_QUEUE_SIZE,
+    )
+    await app.state.generator.start()
+    # 邮件发送和定时任务，WEB_RUN_WORKER=False 时由 python -m app.worker 单独运行
+    app.state.worker = None
+    if settings.WEB_RUN_WORKER:
+        app.state.worker = WorkerService()
+        await app.state.worker.start()
 
     yield
 
-    await app.state.mail_sender.stop()
     # 关闭时执行
-    scheduler.shutdown()
+    if app.state.worker is not None:
+        await app.state.worker.stop()
+    await app.state.generator.stop()
+    await auth.session_store.stop()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -66,6 +45,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER],
 )
 
 ########################################################################
@@ -93,13 +73,15 @@ app.include_router(single_tasks.router, prefix="/single_tasks")
 app.include_router(scheduled_tasks.router, prefix="/scheduled_tasks")
 app.include_router(index.router, prefix="/index")
 app.include_router(mail.router, prefix="/mail")
+app.include_router(task_import.router, prefix="/task_import")
 
 @app.get("/")
 async def index(request: Request):
     return RedirectResponse("/index")
 
 @app.post("/logout")
-async def logout():
+async def logout(request: Request):
+    await auth.delete_session(request)
     response = JSONResponse({"message": "logout success"})
     response = auth.del_user_from_cookie(response)
     return response
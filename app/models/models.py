@@ -1,12 +1,11 @@
 import typing
-import bcrypt
 import datetime
-from dateutil import relativedelta
 from tortoise import fields
 from tortoise.models import Model
 from tortoise.transactions import in_transaction
 
 from app import ulity
+from app.occurrence import Recurrence
 
 
 ########################################################################
@@ -27,10 +26,16 @@ class User(Model):
     # 类型提示, 不在数据库里生成字段
     scheduled_tasks: fields.ReverseRelation["ScheduledTask"]
     single_tasks: fields.ReverseRelation["SingleTask"]
+    sessions: fields.ReverseRelation["Session"]
+    name_grams: fields.ReverseRelation["TaskNameGram"]
 
     def is_pwd_correct(self, password: str) -> bool:
         """密码是否正确"""
-        return bcrypt.checkpw(password.encode("utf-8"), self.password_hash.encode("utf-8"))
+        return ulity.is_pwd_correct(password, self.password_hash)
+
+    async def check_pwd(self, password: str) -> bool:
+        """在 bcrypt 线程池中校验密码，不阻塞事件循环"""
+        return await ulity.check_pwd(password, self.password_hash)
 
 class ScheduledTask(Model):
     id = fields.IntField(pk=True)
@@ -65,19 +70,30 @@ class ScheduledTask(Model):
     # repeat_times<=0 -> 表示无限重复
     repeat_times = fields.IntField(default=-1)
 
-    # 提前提醒天数，字符串，例如 "1,2,7"
-    _advance_days = fields.CharField(max_length=100, default='')
+    # 提前提醒天数，位掩码，第 day 位表示提前 day 天，例如 提前1,2,7天 -> 0b10000110
+    advance_days_mask = fields.BigIntField(default=0)
 
     # 当前任务时间: 指向下一次wei
     current_task_datetime = fields.DatetimeField()
     # 已重复次数
     current_done_times = fields.IntField(default=0)
-    # 提前提醒状态，JSON 字符串，记录哪些提前天数已提醒
-    _current_advance_status = fields.TextField(default='{}')
+    # 提前提醒状态，位掩码，已提醒的提前天数对应的位为 1
+    advance_status_mask = fields.BigIntField(default=0)
+
+    # 下一次提醒时间: 提前提醒和正式提醒中最早的未提醒时间，轮询只查询到期的任务
+    next_remind_at = fields.DatetimeField(null=True)
 
     # 类型提示, 不在数据库里生成字段
     single_tasks: fields.ReverseRelation["SingleTask"]
+    name_grams: fields.ReverseRelation["TaskNameGram"]
 
+    class Meta:
+        indexes = (
+            # 提醒轮询: is_ended=False and next_remind_at<=now
+            ("is_ended", "next_remind_at"),
+            # 任务序列查询: user_id=? order by start_datetime, id
+            ("user_id", "start_datetime"),
+        )
 
     @property
     def is_alive(self) -> bool:
@@ -109,91 +125,55 @@ class ScheduledTask(Model):
             self.ended_at = ulity.now()
         else:
             self.ended_at = None
+        self.fresh_next_remind_at()
 
     @property
-    def advance_days(self):
-        """将 advance_days JSON 字符串转换为 list"""
-        try:
-            return ulity.loads_advance_days(self._advance_days)
-        except:
-            return list()
+    def advance_days(self) -> list[int]:
+        """提前提醒天数，从小到大，例如 [1,2,7]"""
+        return list(ulity.iter_mask_days(self.advance_days_mask))
 
     def set_advance_days(self, days: list):
         # input -> [1,2,7]
-        self._advance_days = ulity.dumps_advance_days(days)
+        self.advance_days_mask = ulity.advance_days_mask(days)
 
     @property
     def current_advance_status(self) -> dict:
-        """将 advance_status JSON 字符串转换为 dict"""
-        try:
-            return ulity.loads_advance_status(self._current_advance_status)
-        except:
-            return dict()
+        """提前提醒状态，例如 {1: True, 2: False, 7: False}"""
+        return {day: bool(self.advance_status_mask >> day & 1) for day in self.advance_days}
 
     def set_current_advance_status(self, status: dict):
-        # input -> {"1": True, "2": False, "7": False}
-        self._current_advance_status = ulity.dumps_advance_status(status)
+        # input -> {1: True, 2: False, 7: False}
+        self.advance_status_mask = ulity.advance_days_mask(day for day, done in status.items() if done)
 
     def reset_current_advance_status(self):
+        """重置提前提醒状态，全部未提醒"""
+        self.advance_status_mask = 0
+
+    def fresh_next_remind_at(self) -> typing.Optional[datetime.datetime]:
         """
-        重置提前提醒状态 -> advance_status = {"1": False, "2": False, "7": False}
-        :return:
+        根据当前任务时间和提前提醒状态，刷新下一次提醒时间
+        :return: 下一次提醒时间，任务结束返回 None
         """
-        self._current_advance_status = ulity.init_advance_status(self._advance_days)
-
-    def next_datetime(self, dt: typing.Union[datetime.datetime] = None) -> typing.Optional[datetime.datetime]:
-        """下一个任务时间"""
-        # 不重复
-        if self.repeat_interval < 0:
+        if self.is_ended or not self.current_task_datetime:
+            self.next_remind_at = None
             return None
 
-        if dt is None:
-            dt = self.current_task_datetime
-        # 天
-        if self.repeat_type == 'days':
-            return dt + relativedelta.relativedelta(days=self.repeat_interval + 1)
-        # 周
-        elif self.repeat_type == 'weeks':
-            return dt + relativedelta.relativedelta(weeks=self.repeat_interval + 1)
-        # 月
-        elif self.repeat_type == 'months':
-            return dt + relativedelta.relativedelta(months=self.repeat_interval + 1)
-        # 年
-        elif self.repeat_type == 'years':
-            return dt + relativedelta.relativedelta(years=self.repeat_interval + 1)
-        # 无效
-        else:
-            return None
+        task_dt = self.current_task_datetime
+        # 正式提醒
+        remind_at = task_dt
+        # 未提醒的提前提醒
+        adv_status = self.current_advance_status
+        for day in self.advance_days:
+            if not adv_status.get(day, False):
+                remind_at = min(remind_at, task_dt - datetime.timedelta(days=day))
 
-    def last_datetime(self, dt: typing.Union[datetime.datetime] = None) -> typing.Optional[datetime.datetime]:
-        """前一个任务时间"""
-        if dt is None:
-            dt = self.current_task_datetime
-
-        # 天
-        if self.repeat_type == 'days':
-            last_dt =  dt - relativedelta.relativedelta(days=self.repeat_interval + 1)
-            threshold = self.start_datetime - relativedelta.relativedelta(days=self.repeat_interval + 1)
-        # 周
-        elif self.repeat_type == 'weeks':
-            last_dt =  dt - relativedelta.relativedelta(weeks=self.repeat_interval + 1)
-            threshold = self.start_datetime - relativedelta.relativedelta(weeks=self.repeat_interval + 1)
-        # 月
-        elif self.repeat_type == 'months':
-            last_dt =  dt - relativedelta.relativedelta(months=self.repeat_interval + 1)
-            threshold = self.start_datetime - relativedelta.relativedelta(months=self.repeat_interval + 1)
-        # 年
-        elif self.repeat_type == 'years':
-            last_dt =  dt - relativedelta.relativedelta(years=self.repeat_interval + 1)
-            threshold = self.start_datetime - relativedelta.relativedelta(years=self.repeat_interval + 1)
-        # 无效
-        else:
-            return None
+        self.next_remind_at = remind_at
+        return remind_at
 
-        if last_dt >= threshold:
-            return last_dt
-        else:
-            return None
+    @property
+    def recurrence(self) -> Recurrence:
+        """任务时间规则"""
+        return Recurrence(self.start_datetime, self.repeat_type, self.repeat_interval)
 
     def next_single_task_datetime(self, start_dt: typing.Union[datetime.datetime] = None) -> typing.Optional[datetime.datetime]:
         """
@@ -201,59 +181,34 @@ class ScheduledTask(Model):
         :param start_dt:   起始时间，如果是None，从task.current_task_datetime开始
         :return:
         """
-        # todo 优化两个 while true
+        recurrence = self.recurrence
         if start_dt is None:
             # 没有下一个任务
             if not self.has_next_task:
                 return None
             else:
-                return self.next_datetime()
-        else:
-            # 小于任务起始时间 -> start_datetime
-            if start_dt < self.start_datetime:
-                return self.start_datetime
-            # 大于等于任务起始时间
-            else:
-                # 不重复
-                if self.repeat_interval < 0:
-                    return None
-                else:
-                    # 当前任务时间
-                    cur_dt = self.current_task_datetime
-                    # 当前重复次数
-                    cur_times = self.current_done_times
-
-                    # 小于当前时间
-                    if start_dt < cur_dt:
-                        while True:
-                            last_dt = self.last_datetime(cur_dt)
-                            # 没有前一个任务
-                            if last_dt is None:
-                                return None
-                            else:
-                                # 前一个任务 小于等于 start_dt
-                                if last_dt <= start_dt:
-                                    return cur_dt
-                                else:
-                                    cur_dt = last_dt
-                    # 大于等于当前时间
-                    else:
-                        # 没有下一个任务
-                        if not self.has_next_task:
-                            return None
-                        else:
-                            while True:
-                                next_dt = self.next_datetime(cur_dt)
-                                cur_times += 1
-                                # 超过重复需求
-                                if 0 < self.repeat_times <= cur_times:
-                                    return None
-                                else:
-                                    # 下一个任务时间 大于 起始时间
-                                    if next_dt > start_dt:
-                                        return next_dt
-                                    else:
-                                        cur_dt = next_dt
+                return recurrence.after(self.current_task_datetime)
+
+        # 小于任务起始时间 -> start_datetime
+        if start_dt < self.start_datetime:
+            return self.start_datetime
+        # 不重复
+        if self.repeat_interval < 0:
+            return None
+
+        # 第一个晚于 start_dt 的任务序号
+        index = recurrence.index_after(start_dt)
+        if index is None:
+            return None
+        # 大于等于当前时间
+        if start_dt >= self.current_task_datetime:
+            # 没有下一个任务
+            if not self.has_next_task:
+                return None
+            # 超过重复需求
+            if 0 < self.repeat_times <= index:
+                return None
+        return recurrence.nth(index)
 
     def fresh_next_task(self) -> typing.Optional[datetime.datetime]:
         """
@@ -281,15 +236,63 @@ class ScheduledTask(Model):
 
             return next_task_dt
 
+    def build_single_tasks(
+            self,
+            enable_dt: datetime.datetime,
+            last_datetime: typing.Optional[datetime.datetime] = None,
+            last_done_times: typing.Optional[int] = None,
+    ) -> list["SingleTask"]:
+        """
+        一次性计算 last_datetime 之后、不晚于 enable_dt 的全部任务时间，最后再生成 SingleTask 对象(不写入数据库)
+        :param enable_dt: 使能时间
+        :param last_datetime: 已生成的最新任务时间，None 表示还没有生成过
+        :param last_done_times: 已生成的最新任务的完成次数
+        """
+        recurrence = self.recurrence
+
+        if last_datetime is not None:
+            # 第一个任务
+            start_dt = self.next_single_task_datetime(last_datetime)
+            if start_dt is None:
+                return list()
+            start_index = recurrence.index_after(last_datetime)
+            next_done_times = last_done_times + 1
+        else:
+            start_dt = self.current_task_datetime
+            start_index = self.current_done_times
+            next_done_times = self.current_done_times + 1
+
+        if start_dt > enable_dt:
+            return list()
+
+        datetimes = [start_dt]
+        # 后续任务
+        if self.has_next_task and start_index is not None:
+            count = None
+            # 不超过重复需求
+            if self.repeat_times > 0:
+                count = max(self.repeat_times - start_index - 1, 0)
+            datetimes.extend(recurrence.between(start_index + 1, enable_dt, count))
+
+        return [
+            SingleTask(
+                user_id=self.user_id,
+                task_id=self.id,
+                datetime=dt,       # 任务时间
+                done_times=next_done_times + i, # 完成次数
+                repeat_times=self.repeat_times,  # 还剩次数，-1表示无限
+                is_done=False,      # 是否完成
+                done_at=None,       # 完成时间
+                remark=None,
+            )
+            for i, dt in enumerate(datetimes)
+        ]
+
     async def generate_single_tasks(self, days_ahead: int = 365):
         """
         根据 ScheduledTask 生成未来 days_ahead 天的 single_tasks
         :param days_ahead: 生成未来多少天的任务
         """
-        single_tasks = list()
-
-        # 任务时间
-        cur_task_dt = self.current_task_datetime
         # 使能时间：当前时间 + days_ahead
         enable_dt = ulity.now() + datetime.timedelta(days=days_ahead)
 
@@ -297,63 +300,22 @@ class ScheduledTask(Model):
         enable_last_task = await SingleTask.filter(task=self).order_by("-datetime").first()
 
         if enable_last_task:
-            start_dt = self.next_single_task_datetime(enable_last_task.datetime)
-            if start_dt is None:
-                return
-            repeat_times = enable_last_task.repeat_times
-            next_done_times = enable_last_task.done_times + 1
-        else:
-            start_dt = cur_task_dt
-            repeat_times = self.repeat_times
-            next_done_times = self.current_done_times + 1
-
-        while start_dt <= enable_dt:
-            single_tasks.append(
-                SingleTask(
-                    user_id=self.user_id,
-                    task=self,
-                    datetime=start_dt,       # 任务时间
-                    done_times=next_done_times, # 完成次数
-                    repeat_times=repeat_times,  # 还剩次数，-1表示无限
-                    is_done=False,      # 是否完成
-                    done_at=None,       # 完成时间
-                    remark=None,
-                )
+            single_tasks = self.build_single_tasks(
+                enable_dt,
+                last_datetime=enable_last_task.datetime,
+                last_done_times=enable_last_task.done_times,
             )
+        else:
+            single_tasks = self.build_single_tasks(enable_dt)
 
-            # 计算下一个提醒时间
-            next_dt = self.next_single_task_datetime(start_dt)
-            if next_dt is None:
-                break
-
-            start_dt = next_dt
-            next_done_times += 1
-
-        # 批量插入
+        # 批量插入，fresher.fresh_single_tasks 同时生成的相同任务忽略
         if single_tasks:
-            async with in_transaction():
-                await SingleTask.bulk_create(single_tasks)
+            async with in_transaction(self._meta.default_connection):
+                await SingleTask.bulk_create(single_tasks, ignore_conflicts=True)
 
     @property
     def repeat_type_str(self) -> str:
-        if self.repeat_interval < 0:
-            return "无"
-
-        if self.repeat_type == "days":
-            repeat_type = "天"
-        elif self.repeat_type == "weeks":
-            repeat_type = "周"
-        elif self.repeat_type == "months":
-            repeat_type = "月"
-        elif self.repeat_type == "years":
-            repeat_type = "年"
-        else:
-            return "无"
-
-        if self.repeat_interval == 0:
-            return f"每{repeat_type}"
-        else:
-            return f"间隔{self.repeat_interval}{repeat_type}"
+        return ulity.repeat_type_str(self.repeat_type, self.repeat_interval)
 
 class SingleTask(Model):
     """
@@ -383,9 +345,128 @@ class SingleTask(Model):
     # 完成时间
     done_at = fields.DatetimeField(null=True)
 
+    class Meta:
+        indexes = (
+            # 单个任务查询: user_id=? and datetime between ? and ? [and is_done=?] order by datetime, id
+            ("user_id", "datetime", "is_done"),
+            # 每个 task 最新的任务: task_id=? order by datetime desc
+            ("task_id", "datetime"),
+        )
+        # 每个 task 的第 done_times 次任务只有一条，后台生成和每日刷新同时插入时忽略重复的任务
+        unique_together = (("task", "done_times"),)
+
     def done(self, done: bool):
         self.is_done = done
         if done:
             self.done_at = ulity.now()
         else:
-            self.done_at = None
\ No newline at end of file
+            self.done_at = None
+
+class MailOutbox(Model):
+    """
+    待发送的提醒邮件，与任务状态在同一事务中写入，保证进程重启后不丢失
+    """
+    id = fields.IntField(pk=True)
+
+    # 关联任务
+    task = fields.ForeignKeyField("models.ScheduledTask", related_name="mails", null=True)
+    # 邮件内容，app.mail.format_mail_task 的结果
+    payload = fields.JSONField()
+
+    # 状态: 'pending' | 'sending' | 'sent' | 'failed'
+    status = fields.CharField(max_length=10, default="pending")
+    # 已尝试次数
+    attempts = fields.IntField(default=0)
+    # 下一次尝试时间，sending 状态表示认领过期时间
+    next_attempt_at = fields.DatetimeField()
+    # 最近一次失败原因
+    last_error = fields.TextField(null=True)
+
+    # 创建时间
+    created_at = fields.DatetimeField(auto_now_add=True)
+    # 发送成功时间
+    sent_at = fields.DatetimeField(null=True)
+
+    class Meta:
+        indexes = (("status", "next_attempt_at"),)
+
+
+class Session(Model):
+    """
+    登录 session，缓存用户信息，校验时不再查询用户表
+    """
+    # session id
+    id = fields.CharField(max_length=64, pk=True)
+
+    # 关联用户
+    user = fields.ForeignKeyField("models.User", related_name="sessions")
+    # 用户信息
+    username = fields.CharField(max_length=100)
+    email = fields.CharField(max_length=200, null=True)
+
+    # 过期时间
+    expires_at = fields.DatetimeField(index=True)
+
+
+class TaskNameGram(Model):
+    """
+    任务名称的二元分词，用于按名称搜索任务，代替 LIKE 模糊查询
+    """
+    id = fields.IntField(pk=True)
+
+    # 关联用户，按用户过滤
+    user = fields.ForeignKeyField("models.User", related_name="name_grams")
+    # 关联任务
+    task = fields.ForeignKeyField("models.ScheduledTask", related_name="name_grams")
+
+    # 小写后的两个字符
+    gram = fields.CharField(max_length=2)
+
+    class Meta:
+        indexes = (("user_id", "gram"),)
+
+
+class Lease(Model):
+    """
+    进程间租约，用于选出唯一执行定时任务的进程
+    """
+    # 租约名称
+    name = fields.CharField(max_length=64, pk=True)
+    # 持有者
+    holder = fields.CharField(max_length=128)
+    # 过期时间，持有者需在过期前续约
+    expires_at = fields.DatetimeField()
+
+
+class ImportJob(Model):
+    """
+    批量导入任务，后台逐批写入，前端轮询进度
+    """
+    id = fields.IntField(pk=True)
+
+    # 关联用户
+    user = fields.ForeignKeyField("models.User", related_name="import_jobs")
+    # 文件格式: 'csv' | 'ndjson'
+    format = fields.CharField(max_length=10)
+
+    # 状态: 'pending' | 'running' | 'done' | 'failed'
+    status = fields.CharField(max_length=10, default="pending")
+    # 已读取行数
+    total = fields.IntField(default=0)
+    # 导入成功行数
+    imported = fields.IntField(default=0)
+    # 校验失败行数
+    failed = fields.IntField(default=0)
+    # 失败的行 [{"line": 3, "error": "..."}]，只保留前 IMPORT_MAX_ERRORS 条
+    errors = fields.JSONField(default=list)
+
+    # 创建时间
+    created_at = fields.DatetimeField(auto_now_add=True)
+    # 结束时间
+    finished_at = fields.DatetimeField(null=True)
+    # 最后一次更新进度的时间，超过 IMPORT_STALE_SECONDS 未更新视为导入进程已退出
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        # 中断的导入任务: status in ('pending', 'running') and updated_at < ?
+        indexes = (("status", "updated_at"),)
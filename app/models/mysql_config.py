@@ -1,30 +1,70 @@
+import typing
+import logging
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
 from app.env import settings
 
+# 主库的连接名；配置了只读副本时有多个连接，in_transaction 需要指定连接名
+DEFAULT_CONNECTION = "default"
+# 只读副本的连接名，列表查询通过 read_db() 使用
+REPLICA_CONNECTION = "replica"
+
+
+def _connection(host: str, port: int, user: str, password: str) -> dict:
+    return {
+        'engine': 'tortoise.backends.mysql',  # MySQL or Mariadb
+        'credentials': {
+            'host': host,
+            'port': port,
+            'user': user,
+            'password': password,
+            'database': settings.SQL_DATABASE,
+            'charset': 'utf8mb4',
+            # 连接池
+            'minsize': settings.SQL_POOL_MINSIZE,
+            'maxsize': settings.SQL_POOL_MAXSIZE,
+            'pool_recycle': settings.SQL_POOL_RECYCLE,
+            "echo": settings.SQL_ECHO,
+        }
+    }
+
+
 MYSQL_TORTOISE_ORM = {
     'connections': {
-        'default': {
-            'engine': 'tortoise.backends.mysql',  # MySQL or Mariadb
-            'credentials': {
-                'host': settings.SQL_HOST,
-                'port': settings.SQL_PORT,
-                'user': settings.SQL_USER,
-                'password': settings.SQL_PASSWORD,
-                'database': settings.SQL_DATABASE,
-                'charset': 'utf8mb4',
-                "echo": True
-            }
-        },
+        DEFAULT_CONNECTION: _connection(settings.SQL_HOST, settings.SQL_PORT, settings.SQL_USER, settings.SQL_PASSWORD),
     },
     'apps': {
         'models': {
             'models': ['app.models.models', "aerich.models"],
-            'default_connection': 'default',
+            'default_connection': DEFAULT_CONNECTION,
         }
     },
     'use_tz': False,
     'timezone': 'Asia/Shanghai'
 }
 
+if settings.SQL_REPLICA_HOST:
+    MYSQL_TORTOISE_ORM['connections'][REPLICA_CONNECTION] = _connection(
+        settings.SQL_REPLICA_HOST,
+        settings.SQL_REPLICA_PORT or settings.SQL_PORT,
+        settings.SQL_REPLICA_USER or settings.SQL_USER,
+        settings.SQL_REPLICA_PASSWORD or settings.SQL_PASSWORD,
+    )
+
+# SQL 日志级别，DEBUG 时 tortoise 记录每条 SQL
+for _name in ("tortoise.db_client", "aiomysql"):
+    logging.getLogger(_name).setLevel(settings.SQL_LOG_LEVEL.upper())
+
+
+def read_db() -> typing.Optional[BaseDBAsyncClient]:
+    """
+    列表查询使用的连接: 配置了只读副本时返回副本，否则返回 None(使用主库)
+    副本有复制延迟，刚写入的数据可能查不到，写入和写入前的检查都使用主库
+    """
+    if settings.SQL_REPLICA_HOST:
+        return connections.get(REPLICA_CONNECTION)
+    return None
+
 
 # 1. 安装: pip install aerich
 # 2. 初始化配置: aerich init -t app.models.mysql_config.MYSQL_TORTOISE_ORM
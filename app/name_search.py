@@ -0,0 +1,108 @@
+"""
+任务名称搜索
+
+任务名称按两个字符切分后保存在 TaskNameGram 中，搜索时先用分词找到候选任务，
+再对候选任务做 LIKE 校验，避免对整个用户的任务做 LIKE '%...%' 扫描
+
+已有数据回填: python -m app.name_search
+"""
+import typing
+import asyncio
+import logging
+from tortoise import Tortoise
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.functions import Count
+from tortoise.transactions import in_transaction
+from app.models.models import ScheduledTask, TaskNameGram
+from app.models.mysql_config import DEFAULT_CONNECTION, MYSQL_TORTOISE_ORM
+
+_logger = logging.getLogger(__name__)
+
+# 分词长度
+GRAM_SIZE = 2
+# 回填每批任务数量
+BACKFILL_BATCH_SIZE = 1000
+
+
+def name_grams(name: str) -> set[str]:
+    """名称的全部分词，不区分大小写"""
+    name = name.lower()
+    return {name[i:i + GRAM_SIZE] for i in range(len(name) - GRAM_SIZE + 1)}
+
+
+def build_grams(task_id: int, user_id: int, name: str) -> list[TaskNameGram]:
+    return [TaskNameGram(task_id=task_id, user_id=user_id, gram=gram) for gram in name_grams(name)]
+
+
+async def index_task_name(
+        task_id: int,
+        user_id: int,
+        name: str,
+        using_db: typing.Optional[BaseDBAsyncClient] = None,
+):
+    """创建或重命名任务后更新分词，应与任务写入在同一事务中"""
+    await TaskNameGram.filter(task_id=task_id).using_db(using_db).delete()
+    grams = build_grams(task_id, user_id, name)
+    if grams:
+        await TaskNameGram.bulk_create(grams, using_db=using_db)
+
+
+async def rename_task(task_id: int, user_id: int, name: str) -> bool:
+    """重命名任务并更新分词，任务不存在返回 False"""
+    async with in_transaction(DEFAULT_CONNECTION) as conn:
+        updated = await ScheduledTask.filter(id=task_id, user_id=user_id).using_db(conn).update(name=name)
+        if updated:
+            await index_task_name(task_id, user_id, name, using_db=conn)
+    return bool(updated)
+
+
+async def search_task_ids(
+        user_id: int,
+        keyword: str,
+        using_db: typing.Optional[BaseDBAsyncClient] = None,
+) -> list[int]:
+    """名称包含 keyword 的任务 id"""
+    grams = name_grams(keyword)
+    query = ScheduledTask.filter(user_id=user_id, name__icontains=keyword).using_db(using_db)
+    # 少于两个字符无法分词，直接在该用户的任务中 LIKE
+    if grams:
+        candidates = TaskNameGram.filter(user_id=user_id, gram__in=list(grams)).annotate(
+            matched=Count("gram", distinct=True),
+        ).group_by("task_id").filter(matched__gte=len(grams)).using_db(using_db).values_list("task_id", flat=True)
+        # 包含全部分词的任务不一定包含整个关键字，需要再校验
+        query = query.filter(id__in=await candidates)
+    return await query.values_list("id", flat=True)
+
+
+async def backfill(batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """为已有任务重新生成分词，返回任务数量"""
+    total, last_id = 0, 0
+    while True:
+        tasks = await ScheduledTask.filter(id__gt=last_id).order_by("id").limit(batch_size).values(
+            "id", "user_id", "name"
+        )
+        if not tasks:
+            break
+        task_ids = [task["id"] for task in tasks]
+        grams = [gram for task in tasks for gram in build_grams(task["id"], task["user_id"], task["name"])]
+        async with in_transaction(DEFAULT_CONNECTION) as conn:
+            await TaskNameGram.filter(task_id__in=task_ids).using_db(conn).delete()
+            if grams:
+                await TaskNameGram.bulk_create(grams, using_db=conn)
+        total += len(tasks)
+        last_id = task_ids[-1]
+        _logger.info(f"backfill task name grams: {total} tasks")
+    return total
+
+
+async def _main():
+    await Tortoise.init(config=MYSQL_TORTOISE_ORM)
+    try:
+        print(f"backfill task name grams: {await backfill()} tasks")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,147 @@
+import typing
+import calendar
+import datetime
+
+
+########################################################################
+# 周期任务时间计算
+########################################################################
+# 固定长度的重复类型 -> 每个周期的天数
+FIXED_REPEAT_DAYS = {
+    "days": 1,
+    "weeks": 7,
+}
+# 按月计算的重复类型 -> 每个周期的月数
+MONTH_REPEAT_MONTHS = {
+    "months": 1,
+    "years": 12,
+}
+
+
+def add_months(dt: datetime.datetime, months: int) -> datetime.datetime:
+    """
+    月份加减，日期超出目标月份天数时取该月最后一天
+    例如 1月31日 + 1个月 -> 2月28日(29日)
+    """
+    total = dt.year * 12 + dt.month - 1 + months
+    year, month = divmod(total, 12)
+    month += 1
+    day = min(dt.day, calendar.monthrange(year, month)[1])
+    return dt.replace(year=year, month=month, day=day)
+
+
+def wall_clock(dt: datetime.datetime, tzinfo: typing.Optional[datetime.tzinfo] = None) -> datetime.datetime:
+    """转换到 tzinfo 时区后去掉时区信息，按墙上时间计算"""
+    if dt.tzinfo is not None and tzinfo is not None:
+        dt = dt.astimezone(tzinfo)
+    return dt.replace(tzinfo=None)
+
+
+class Recurrence:
+    """
+    周期任务的时间规则，第 k 次任务时间 = start + k * 周期
+    所有时间都以 start 为基准直接计算，不逐次累加，因此月末截断不会累积
+    """
+    __slots__ = ("start", "repeat_type", "step")
+
+    def __init__(self, start: datetime.datetime, repeat_type: str, repeat_interval: int):
+        """
+        :param start: 任务开始时间
+        :param repeat_type: 'none' | 'days' | 'weeks' | 'months' | 'years'
+        :param repeat_interval: <0 不重复; 0 每天/周/月/年; X 每隔X+1天/周/月/年
+        """
+        self.start = start
+        self.repeat_type = repeat_type
+        # 周期长度(单位个数)，不重复或类型无效为 0
+        if repeat_interval < 0 or (repeat_type not in FIXED_REPEAT_DAYS and repeat_type not in MONTH_REPEAT_MONTHS):
+            self.step = 0
+        else:
+            self.step = repeat_interval + 1
+
+    @property
+    def is_repeat(self) -> bool:
+        return self.step > 0
+
+    @property
+    def period(self) -> typing.Optional[datetime.timedelta]:
+        """固定长度的周期，按月计算的周期返回 None"""
+        if not self.is_repeat or self.repeat_type not in FIXED_REPEAT_DAYS:
+            return None
+        return datetime.timedelta(days=FIXED_REPEAT_DAYS[self.repeat_type] * self.step)
+
+    @property
+    def period_months(self) -> typing.Optional[int]:
+        """按月计算的周期月数，固定长度的周期返回 None"""
+        if not self.is_repeat or self.repeat_type not in MONTH_REPEAT_MONTHS:
+            return None
+        return MONTH_REPEAT_MONTHS[self.repeat_type] * self.step
+
+    def nth(self, k: int) -> typing.Optional[datetime.datetime]:
+        """第 k 次任务时间，k 从 0 开始"""
+        if k == 0:
+            return self.start
+        if k < 0 or not self.is_repeat:
+            return None
+        period = self.period
+        if period is not None:
+            return self.start + period * k
+        return add_months(self.start, self.period_months * k)
+
+    def index_after(self, dt: datetime.datetime) -> typing.Optional[int]:
+        """第一个晚于 dt 的任务序号，没有则返回 None"""
+        start = wall_clock(self.start)
+        t = wall_clock(dt, self.start.tzinfo)
+        if t < start:
+            return 0
+        if not self.is_repeat:
+            return None
+
+        period = self.period
+        if period is not None:
+            return (t - start) // period + 1
+
+        # 按月份差估算，月末截断 / 当月内时间先后最多使估算值偏小 1
+        months = self.period_months
+        k = ((t.year - start.year) * 12 + t.month - start.month) // months
+        if wall_clock(self.nth(k)) <= t:
+            k += 1
+        return k
+
+    def after(self, dt: datetime.datetime) -> typing.Optional[datetime.datetime]:
+        """第一个晚于 dt 的任务时间，没有则返回 None"""
+        k = self.index_after(dt)
+        if k is None:
+            return None
+        return self.nth(k)
+
+    def between(
+            self,
+            first: int,
+            until: datetime.datetime,
+            count: typing.Optional[int] = None,
+    ) -> list[datetime.datetime]:
+        """
+        一次性生成第 first 次开始、不晚于 until 的全部任务时间
+        :param first: 起始序号
+        :param until: 截止时间(包含)
+        :param count: 最多生成的数量，None 表示不限制
+        """
+        if first < 0 or (first > 0 and not self.is_repeat):
+            return list()
+
+        # 截止序号(不包含)
+        end = self.index_after(until)
+        if end is None:
+            end = 1
+        if count is not None:
+            end = min(end, first + count)
+        if end <= first:
+            return list()
+
+        period = self.period
+        if period is not None:
+            base = self.nth(first)
+            return [base + period * i for i in range(end - first)]
+
+        months = self.period_months or 0
+        return [add_months(self.start, months * k) for k in range(first, end)]
@@ -0,0 +1,128 @@
+import json
+import base64
+import typing
+import datetime
+import zoneinfo
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+# 每页默认数量和最大数量
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+# 下一页游标所在的响应头，没有下一页时不返回
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# 数据库时区，游标中的时间统一转换到该时区
+DB_TZINFO = zoneinfo.ZoneInfo("Asia/Shanghai")
+
+
+def encode_cursor(dt: datetime.datetime, id: int) -> str:
+    """根据本页最后一行的 (时间, id) 生成游标"""
+    raw = f"{dt.astimezone(DB_TZINFO).isoformat()},{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    """解析游标，格式错误返回 400"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        dt, id = raw.rsplit(",", 1)
+        return datetime.datetime.fromisoformat(dt), int(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="游标格式错误")
+
+def after_cursor(field: str, cursor: str) -> Q:
+    """(field, id) 大于游标位置的条件"""
+    dt, id = decode_cursor(cursor)
+    return Q(**{f"{field}__gt": dt}) | Q(**{field: dt, "id__gt": id})
+
+
+async def fetch_page(
+        query: QuerySet,
+        field: str,
+        fields: typing.Iterable[str],
+        limit: int,
+        cursor: typing.Optional[str] = None,
+        **related: str,
+) -> tuple[list[dict], typing.Optional[str]]:
+    """
+    按 (field, id) 键集分页查询一页，只取需要的列
+    :param query: 已经过滤好的查询
+    :param field: 排序的时间字段
+    :param fields: 返回的列
+    :param limit: 每页数量
+    :param cursor: 上一页返回的游标
+    :param related: 关联表的列，例如 task_name="task__name"
+    :return: (本页数据, 下一页游标)
+    """
+    if cursor:
+        query = query.filter(after_cursor(field, cursor))
+    # 多取一行判断是否还有下一页
+    rows = await query.order_by(field, "id").limit(limit + 1).values(*fields, **related)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1][field], rows[-1]["id"])
+
+async def iter_pages(
+        query: QuerySet,
+        field: str,
+        fields: typing.Iterable[str],
+        limit: int,
+        cursor: typing.Optional[str] = None,
+        **related: str,
+) -> typing.AsyncIterator[list[dict]]:
+    """从游标位置开始逐页查询，直到没有下一页"""
+    while True:
+        rows, cursor = await fetch_page(query, field, fields, limit, cursor, **related)
+        if rows:
+            yield rows
+        if cursor is None:
+            break
+
+
+def page_responses(model: type) -> dict:
+    """
+    分页接口的 OpenAPI 说明
+    接口直接返回 Response，不经过 response_model 校验，在这里声明每行的结构、下一页游标响应头和 NDJSON 格式
+    """
+    return {
+        200: {
+            "model": list[model],
+            "description": "一页数据；stream=true 时以 NDJSON 逐行返回游标之后的全部结果",
+            "headers": {
+                NEXT_CURSOR_HEADER: {
+                    "description": "下一页游标，作为 cursor 参数请求下一页；没有下一页时不返回",
+                    "schema": {"type": "string"},
+                },
+            },
+            "content": {
+                NDJSON_MEDIA_TYPE: {"schema": {"type": "string", "description": "每行一个 JSON 对象"}},
+            },
+        },
+    }
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+def json_page(rows: list[dict], next_cursor: typing.Optional[str]) -> Response:
+    """返回一页 JSON 数组，下一页游标放在响应头中"""
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return Response(content=dumps(rows), media_type="application/json", headers=headers)
+
+def ndjson_response(
+        pages: typing.AsyncIterator[list[dict]],
+        format_row: typing.Callable[[dict], dict],
+) -> StreamingResponse:
+    """逐页查询并逐行输出 NDJSON，内存占用与总行数无关"""
+    async def _lines():
+        async for rows in pages:
+            yield "".join(dumps(format_row(row)) + "\n" for row in rows)
+    return StreamingResponse(_lines(), media_type=NDJSON_MEDIA_TYPE)
@@ -3,7 +3,7 @@ from fastapi import HTTPException, APIRouter, Request
 from fastapi.responses import RedirectResponse, JSONResponse, FileResponse
 from pydantic import BaseModel
 from app.models.models import User
-from app import auth
+from app import auth, ulity
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # app/ 的上一级目录
@@ -30,12 +30,18 @@ async def login(request: Request):
 @router.post("/")
 async def login(user_in: UserIn):
     user = await User.filter(username=user_in.username).first()
-    if not user or not user.is_pwd_correct(user_in.password):
+    if not user:
+        raise HTTPException(status_code=400, detail="用户名或密码错误")
+    try:
+        pwd_correct = await user.check_pwd(user_in.password)
+    except ulity.BusyError:
+        raise HTTPException(status_code=503, detail="服务繁忙，请稍后再试")
+    if not pwd_correct:
         raise HTTPException(status_code=400, detail="用户名或密码错误")
 
     response = JSONResponse({"message": "login success"})
     # 创建 session
-    user_id_str = auth.create_session(user.id)
-    # 将 user_id 加入 cookie
-    response = auth.add_user_2_cookie(response, user_id_str)
+    session_id = await auth.create_session(user)
+    # 将 session_id 加入 cookie
+    response = auth.add_user_2_cookie(response, session_id)
     return response
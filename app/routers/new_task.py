@@ -1,11 +1,12 @@
 import os
-import typing
 from fastapi import HTTPException, APIRouter, Depends, Request
 from fastapi.responses import RedirectResponse, FileResponse
-from pydantic import BaseModel
+from tortoise.transactions import in_transaction
 from app import auth
-from app.models.models import User, ScheduledTask
-from app import ulity
+from app import name_search
+from app.tasks import TaskIn, build_scheduled_task
+from app.env import settings
+from app.models.mysql_config import DEFAULT_CONNECTION
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # app/ 的上一级目录
 STATIC_DIR = os.path.join(BASE_DIR, "statics")
@@ -13,16 +14,6 @@ STATIC_DIR = os.path.join(BASE_DIR, "statics")
 
 router = APIRouter()
 
-class TaskIn(BaseModel):
-    name: str
-    message: str = ""
-    start_date: str
-    start_time: str
-    repeat_type: str = "none"
-    repeat_interval: int = -1
-    repeat_times: int = -1
-    advance_days: typing.List[int] = list()
-
 @router.get("/")
 async def create_new_task(request: Request):
     try:
@@ -34,35 +25,26 @@ async def create_new_task(request: Request):
         return RedirectResponse("/login")
 
 @router.post("/")
-async def create_new_task(task_in: TaskIn, user: User = Depends(auth.get_user_from_request)):
-    # 组合日期时间
-    start_datetime = ulity.form_datetime(task_in.start_date, task_in.start_time)
-    if not start_datetime:
-        raise HTTPException(status_code=400, detail="日期时间格式错误")
-
-    # 提前提醒天数
-    advance_days_json = ulity.dumps_advance_days(task_in.advance_days)
-    # 初始化当前提醒状态
-    current_advance_status_json = ulity.init_advance_status(task_in.advance_days)
-
+async def create_new_task(request: Request, task_in: TaskIn, user: auth.SessionUser = Depends(auth.get_user_from_request)):
     # 创建序列任务
-    task = await ScheduledTask.create(
-        user=user,
-        name=task_in.name,
-        message=task_in.message,
-        start_datetime=start_datetime,
-
-        repeat_type=task_in.repeat_type,
-        repeat_interval=task_in.repeat_interval,
-        repeat_times=task_in.repeat_times,
-        _advance_days=advance_days_json,
-
-        current_task_datetime=start_datetime,
-        _current_advance_status=current_advance_status_json,
-    )
-
-    # 生成单个任务实例
-    await task.generate_single_tasks()
+    try:
+        task = build_scheduled_task(task_in, user.id)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+
+    async with in_transaction(DEFAULT_CONNECTION) as conn:
+        await task.save(using_db=conn)
+        # 名称分词
+        await name_search.index_task_name(task.id, user.id, task.name, using_db=conn)
+    # 加入提醒定时器
+    if request.app.state.worker is not None:
+        request.app.state.worker.schedule_remind(task.id, task.next_remind_at)
+
+    # 生成单个任务实例，按需计算模式下查询时再计算
+    # 只同步生成最近几天，页面上马上可以看到，其余交给后台生成，响应时间与重复频率无关
+    if settings.SINGLE_TASK_MODE == "eager":
+        await task.generate_single_tasks(days_ahead=settings.GENERATE_EAGER_DAYS)
+        request.app.state.generator.submit(task.id)
 
     return {"success": True, "message": "create new task successfully"}
 
@@ -37,7 +37,10 @@ async def register(user_in: UserIn):
     if await User.filter(username=user_in.username).exists():
         raise HTTPException(status_code=400, detail="用户名已存在")
 
-    hashed_pwd = ulity.get_hashed_pwd(user_in.password)
+    try:
+        hashed_pwd = await ulity.hash_pwd(user_in.password)
+    except ulity.BusyError:
+        raise HTTPException(status_code=503, detail="服务繁忙，请稍后再试")
 
     user = await User.create(
         username=user_in.username,
@@ -1,12 +1,14 @@
 import os
 import datetime
 import typing
-from fastapi import APIRouter, Depends, Request, HTTPException, status
+from fastapi import APIRouter, Depends, Request, HTTPException, Query, status
 from fastapi.responses import FileResponse, RedirectResponse
-from pydantic import BaseModel, ConfigDict, field_validator
-from app.models.models import User, ScheduledTask
+from pydantic import BaseModel, ConfigDict
+from app.models.models import ScheduledTask
 from app import auth
 from app import ulity
+from app import pagination, name_search
+from app.models.mysql_config import read_db
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # app/ 的上一级目录
@@ -31,27 +33,6 @@ class ScheduledTaskOut(BaseModel):
 
     # model_config = ConfigDict(from_attributes=True)  # 支持 ORM 对象直接序列化
 
-    # 将数据库中存储的 JSON 字符串解析为列表或字典
-    @field_validator("advance_days", mode="before")
-    @classmethod
-    def parse_advance_days(cls, v: str):
-        if isinstance(v, str):
-            try:
-                return ulity.loads_advance_days(v)
-            except:
-                return list()
-        return v
-
-    @field_validator("current_advance_status", mode="before")
-    @classmethod
-    def parse_current_advance_status(cls, v: str):
-        if isinstance(v, str):
-            try:
-                return ulity.loads_advance_status(v)
-            except:
-                return dict()
-        return v
-
 
 @router.get("/")
 async def show_scheduled_tasks(request: Request):
@@ -64,32 +45,80 @@ async def show_scheduled_tasks(request: Request):
         return RedirectResponse("/login")
 
 
-@router.get("/search", response_model=list[ScheduledTaskOut])
+# 任务序列查询的列
+SCHEDULED_TASK_FIELDS = (
+    "id", "name", "message", "start_datetime", "repeat_type", "repeat_interval", "repeat_times",
+    "advance_days_mask", "current_task_datetime", "current_done_times", "advance_status_mask", "is_ended",
+)
+
+def format_scheduled_task(row: dict) -> dict:
+    """将查询结果整理为 ScheduledTaskOut 的结构"""
+    row = dict(row)
+    # 位掩码解析为天数列表和 {天数: 是否已提醒}
+    advance_days = list(ulity.iter_mask_days(row.pop("advance_days_mask")))
+    status_mask = row.pop("advance_status_mask")
+    row["advance_days"] = advance_days
+    row["current_advance_status"] = {day: bool(status_mask >> day & 1) for day in advance_days}
+    return row
+
+
+@router.get("/search", response_model=None, responses=pagination.page_responses(ScheduledTaskOut))
 async def list_scheduled_tasks(
     is_ended: typing.Optional[bool] = None,
     task_name: typing.Optional[str] = None,
-    user: User = Depends(auth.get_user_from_request),
+    user: auth.SessionUser = Depends(auth.get_user_from_request),
+    cursor: typing.Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    stream: bool = False,
 ):
-    query = ScheduledTask.filter(user_id=user.id)
+    """
+    按 (start_datetime, id) 分页查询，下一页游标在 X-Next-Cursor 响应头中
+    stream=true 时以 NDJSON 逐行返回游标之后的全部结果
+    配置了只读副本时在副本上查询
+    """
+    db = read_db()
+    query = ScheduledTask.filter(user_id=user.id).using_db(db)
 
     if task_name:
-        query = query.filter(name__icontains=task_name)
+        query = query.filter(id__in=await name_search.search_task_ids(user.id, task_name, using_db=db))
 
     if is_ended is not None and is_ended != "":
         query = query.filter(is_ended=is_ended)
 
-    results = await query.order_by("start_datetime")
-    return results
+    if stream:
+        pages = pagination.iter_pages(query, "start_datetime", SCHEDULED_TASK_FIELDS, limit, cursor)
+        return pagination.ndjson_response(pages, format_scheduled_task)
+
+    rows, next_cursor = await pagination.fetch_page(query, "start_datetime", SCHEDULED_TASK_FIELDS, limit, cursor)
+    return pagination.json_page([format_scheduled_task(row) for row in rows], next_cursor)
 
 @router.post("/{task_id}/ended")
-async def mark_scheduled_task_ended(task_id: int, user: User = Depends(auth.get_user_from_request)):
-    task = await ScheduledTask.get_or_none(id=task_id, user_id=user.id)
-    if not task:
+async def mark_scheduled_task_ended(request: Request, task_id: int, user: auth.SessionUser = Depends(auth.get_user_from_request)):
+    # 单条 UPDATE，以影响行数判断任务是否存在
+    updated = await ScheduledTask.filter(id=task_id, user_id=user.id).update(
+        is_ended=True,
+        ended_at=ulity.now(),
+        next_remind_at=None,
+    )
+    if not updated:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            status_code=status.HTTP_404_NOT_FOUND,
             detail=f"task[{task_id}] not found"
         )
-    task.end(True)
-    await task.save()
+    # 从提醒定时器中移除
+    if request.app.state.worker is not None:
+        request.app.state.worker.schedule_remind(task_id, None)
     return {"success": True, "message": "mark scheduled task ended successfully"}
 
+
+class RenameIn(BaseModel):
+    name: str
+
+@router.post("/{task_id}/rename")
+async def rename_scheduled_task(task_id: int, rename_in: RenameIn, user: auth.SessionUser = Depends(auth.get_user_from_request)):
+    if not await name_search.rename_task(task_id, user.id, rename_in.name):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"task[{task_id}] not found"
+        )
+    return {"success": True, "message": "rename scheduled task successfully"}
@@ -1,12 +1,15 @@
 import os
 import datetime
 import typing
-from pydantic import BaseModel, ConfigDict
-from fastapi import APIRouter, Depends, Request, HTTPException, status
+from pydantic import BaseModel, ConfigDict, Field
+from fastapi import APIRouter, Depends, Request, HTTPException, Query, status
 from fastapi.responses import RedirectResponse, FileResponse
-from app.models.models import User, SingleTask
+from app.models.models import SingleTask
 from app import auth
 from app import ulity
+from app import pagination, name_search, lazy_tasks
+from app.env import settings
+from app.models.mysql_config import read_db
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # app/ 的上一级目录
@@ -20,7 +23,8 @@ class ScheduledTaskOut(BaseModel):
     message: typing.Optional[str] = None
 
 class SingleTaskOut(BaseModel):
-    id : int
+    # 按需计算模式下未写入数据库的任务为 None
+    id : typing.Optional[int] = None
     task: ScheduledTaskOut
     datetime: datetime.datetime
     done_times: int
@@ -41,15 +45,41 @@ async def show_single_tasks(request: Request):
         return RedirectResponse("/login")
 
 
-@router.get("/search", response_model=list[SingleTaskOut])
+# 单个任务查询的列
+SINGLE_TASK_FIELDS = ("id", "datetime", "done_times", "repeat_times", "remark", "is_done", "task_id")
+SINGLE_TASK_RELATED = {"task_name": "task__name", "task_message": "task__message"}
+
+def format_single_task(row: dict) -> dict:
+    """将查询结果整理为 SingleTaskOut 的结构"""
+    return {
+        "id": row["id"],
+        "task": {"id": row["task_id"], "name": row["task_name"], "message": row["task_message"]},
+        "datetime": row["datetime"],
+        "done_times": row["done_times"],
+        "repeat_times": row["repeat_times"],
+        "remark": row["remark"],
+        "is_done": row["is_done"],
+    }
+
+
+@router.get("/search", response_model=None, responses=pagination.page_responses(SingleTaskOut))
 async def list_single_tasks(
     start_date: str,
     end_date: str,
     is_done: typing.Optional[bool] = None,
     task_name: typing.Optional[str] = None,
-    user: User = Depends(auth.get_user_from_request),
-    days_ahead: int = 365
+    user: auth.SessionUser = Depends(auth.get_user_from_request),
+    days_ahead: int = 365,
+    cursor: typing.Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    stream: bool = False,
 ):
+    """
+    按 (datetime, id) 分页查询，下一页游标在 X-Next-Cursor 响应头中
+    stream=true 时以 NDJSON 逐行返回游标之后的全部结果
+    SINGLE_TASK_MODE=lazy 时按 (datetime, task_id) 分页，未写入数据库的任务 id 为 null
+    配置了只读副本时在副本上查询
+    """
     start_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d")
     end_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d") + datetime.timedelta(days=1)
 
@@ -58,29 +88,75 @@ async def list_single_tasks(
     if end_dt > max_end:
         end_dt = max_end
 
+    if is_done == "":
+        is_done = None
+    db = read_db()
+    task_ids = await name_search.search_task_ids(user.id, task_name, using_db=db) if task_name else None
+
+    # 按需计算: 已完成的任务都已写入数据库，直接查询
+    if settings.SINGLE_TASK_MODE == "lazy" and is_done is not True:
+        args = (user.id, start_dt, end_dt, limit)
+        kwargs = dict(cursor=cursor, is_done=is_done, task_ids=task_ids, using_db=db)
+        if stream:
+            return pagination.ndjson_response(lazy_tasks.iter_pages(*args, **kwargs), format_single_task)
+        rows, next_cursor = await lazy_tasks.fetch_page(*args, **kwargs)
+        return pagination.json_page([format_single_task(row) for row in rows], next_cursor)
+
     query = SingleTask.filter(
         user_id=user.id,
         datetime__gte=start_dt,
         datetime__lt=end_dt         # 注意这里用 <，不包含end_dt
-    ).prefetch_related("task")
+    ).using_db(db)
 
-    if is_done is not None and is_done != "":
+    if is_done is not None:
         query = query.filter(is_done=is_done)
 
-    if task_name:
-        query = query.filter(task__name__icontains=task_name)
+    if task_ids is not None:
+        query = query.filter(task_id__in=task_ids)
+
+    if stream:
+        pages = pagination.iter_pages(query, "datetime", SINGLE_TASK_FIELDS, limit, cursor, **SINGLE_TASK_RELATED)
+        return pagination.ndjson_response(pages, format_single_task)
+
+    rows, next_cursor = await pagination.fetch_page(
+        query, "datetime", SINGLE_TASK_FIELDS, limit, cursor, **SINGLE_TASK_RELATED
+    )
+    return pagination.json_page([format_single_task(row) for row in rows], next_cursor)
 
-    results = await query.order_by("datetime")
-    return results
+class DoneIn(BaseModel):
+    ids: list[int] = Field(max_length=pagination.MAX_PAGE_SIZE)
+
+@router.post("/done")
+async def mark_single_tasks_done(done_in: DoneIn, user: auth.SessionUser = Depends(auth.get_user_from_request)):
+    """批量标记为完成，只更新属于当前用户的任务"""
+    count = 0
+    if done_in.ids:
+        count = await SingleTask.filter(id__in=done_in.ids, user_id=user.id).update(is_done=True, done_at=ulity.now())
+    return {"success": True, "message": f"mark {count} single tasks done successfully", "count": count}
 
 @router.post("/{task_id}/done")
-async def mark_single_task_done(task_id: int, user: User = Depends(auth.get_user_from_request)):
-    task = await SingleTask.get_or_none(id=task_id, user_id=user.id)
-    if not task:
+async def mark_single_task_done(task_id: int, user: auth.SessionUser = Depends(auth.get_user_from_request)):
+    # 单条 UPDATE，以影响行数判断任务是否存在
+    updated = await SingleTask.filter(id=task_id, user_id=user.id).update(is_done=True, done_at=ulity.now())
+    if not updated:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            status_code=status.HTTP_404_NOT_FOUND,
             detail=f"task[{task_id}] not found",
         )
-    task.done(True)
-    await task.save()
+    return {"success": True, "message": "mark single task done successfully"}
+
+@router.post("/virtual/{task_id}/{done_times}/done")
+async def mark_virtual_single_task_done(
+    task_id: int,
+    done_times: int,
+    user: auth.SessionUser = Depends(auth.get_user_from_request),
+):
+    """按需计算模式下，将未写入数据库的第 done_times 次任务标记为完成"""
+    single_task = await lazy_tasks.materialize(user.id, task_id, done_times)
+    if not single_task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"task[{task_id}] occurrence[{done_times}] not found",
+        )
+    await SingleTask.filter(id=single_task.id).update(is_done=True, done_at=ulity.now())
     return {"success": True, "message": "mark single task done successfully"}
@@ -0,0 +1,54 @@
+import typing
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
+from app import auth, importer
+from app.env import settings
+from app.models.models import ImportJob
+
+router = APIRouter()
+
+# 任务进度返回的字段
+IMPORT_JOB_FIELDS = ("id", "format", "status", "total", "imported", "failed", "errors", "created_at", "finished_at")
+
+
+@router.post("/")
+async def import_tasks(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    format: typing.Optional[str] = None,
+    user: auth.SessionUser = Depends(auth.get_user_from_request),
+):
+    """
+    批量导入任务，请求体为 CSV 或 NDJSON 文件内容，例如
+    curl --data-binary @tasks.csv -H "Content-Type: text/csv" /task_import/
+    上传完成后立即返回 job_id，导入在后台进行，通过 GET /task_import/{job_id} 查询进度
+    """
+    fmt = format or importer.guess_format(request.headers.get("content-type"))
+    if fmt not in importer.IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format should be one of {', '.join(importer.IMPORT_FORMATS)}",
+        )
+    try:
+        path = await importer.spool(request.stream(), settings.IMPORT_MAX_BYTES)
+    except importer.ImportTooLarge as err:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(err))
+
+    job = await ImportJob.create(user_id=user.id, format=fmt)
+    # 新任务加入提醒定时器
+    on_created = None
+    worker = request.app.state.worker
+    if worker is not None:
+        on_created = lambda task: worker.schedule_remind(task.id, task.next_remind_at)
+    background_tasks.add_task(importer.run_import, job.id, user.id, path, fmt, on_created)
+    return {"success": True, "message": "import job created", "job_id": job.id}
+
+
+@router.get("/{job_id}")
+async def get_import_job(job_id: int, user: auth.SessionUser = Depends(auth.get_user_from_request)):
+    job = await ImportJob.filter(id=job_id, user_id=user.id).first().values(*IMPORT_JOB_FIELDS)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"import job[{job_id}] not found",
+        )
+    return job
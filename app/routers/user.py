@@ -4,7 +4,8 @@ from fastapi import APIRouter, Depends, Request, HTTPException
 from fastapi.responses import RedirectResponse, FileResponse
 from pydantic import BaseModel, EmailStr
 from app.models.models import User
-from app.routers.mail import MailInfo, MailSender, format_mail_task
+from app.mail import MailInfo, format_mail_task
+from app.worker.outbox import OutboxDispatcher
 from app import auth, ulity
 
 
@@ -35,7 +36,7 @@ async def show_user(request: Request):
 
 
 @router.get("/me", response_model=ProfileOut)
-async def get_current_user_info(user: User = Depends(auth.get_user_from_request)):
+async def get_current_user_info(user: auth.SessionUser = Depends(auth.get_user_from_request)):
     return ProfileOut(
         id=user.id,
         username=user.username,
@@ -44,7 +45,7 @@ async def get_current_user_info(user: User = Depends(auth.get_user_from_request)
 
 
 @router.get("/profile", response_model=ProfileOut)
-async def get_profile(user: User = Depends(auth.get_user_from_request)):
+async def get_profile(user: auth.SessionUser = Depends(auth.get_user_from_request)):
     return ProfileOut(
         id=user.id,
         username=user.username,
@@ -52,14 +53,17 @@ async def get_profile(user: User = Depends(auth.get_user_from_request)):
     )
 
 @router.post("/profile")
-async def update_profile(profile: ProfileIn, user: User = Depends(auth.get_user_from_request)):
-    user.email = profile.email
-    await user.save()
+async def update_profile(profile: ProfileIn, user: auth.SessionUser = Depends(auth.get_user_from_request)):
+    await User.filter(id=user.id).update(email=profile.email)
+    # 同步 session 中缓存的用户信息
+    await auth.session_store.update_user(
+        auth.SessionUser(id=user.id, username=user.username, email=profile.email)
+    )
     return {"success": True, "message": "profile update successfully"}
 
 
 @router.post("/email")
-async def test_email(request: Request, profile: ProfileIn, user: User = Depends(auth.get_user_from_request)):
+async def test_email(request: Request, profile: ProfileIn, user: auth.SessionUser = Depends(auth.get_user_from_request)):
     try:
 
         mail_info = MailInfo(
@@ -75,9 +79,8 @@ async def test_email(request: Request, profile: ProfileIn, user: User = Depends(
             local_image_path="app/statics/logo.jpg"
         )
         mail_task = format_mail_task(mail_info)
-        # 从 app.state 取出全局 MailSender 实例
-        mail_sender: MailSender = request.app.state.mail_sender
-        await mail_sender.add_task(mail_task)
+        # 写入待发送邮件，由 worker 发送
+        await OutboxDispatcher.enqueue(mail_task)
 
         # todo 邮件发送成功再返回 信息
         return {"success": True, "message": "邮件任务添加成功"}
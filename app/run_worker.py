@@ -0,0 +1,72 @@
+"""
+提醒分片 worker: 按 task id 分片处理提醒，可以在多个核 / 多台机器上运行
+每个分片通过租约保证同一时间只有一个进程处理，同一分片启动多个进程时其余进程热备
+
+例如分成 4 片:
+python -m app.run_worker --shard 0/4
+python -m app.run_worker --shard 1/4
+python -m app.run_worker --shard 2/4
+python -m app.run_worker --shard 3/4
+
+使用分片 worker 时，在 .env 中设置 REMIND_SHARDED=True，web / app.worker 不再处理提醒
+"""
+import signal
+import asyncio
+import logging
+import argparse
+from tortoise import Tortoise
+from app.models.mysql_config import MYSQL_TORTOISE_ORM
+from app.env import settings
+from app.worker.leader import LeaderLease
+from app.worker.timer import RemindTimer
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """'i/n' -> (i, n)"""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard: {value}, expected i/n")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"invalid shard: {value}, expected 0 <= i < n")
+    return index, count
+
+
+async def main(shard: tuple[int, int]):
+    await Tortoise.init(config=MYSQL_TORTOISE_ORM)
+
+    # 提醒定时器，获得分片租约后再执行
+    timer = RemindTimer(
+        shard=shard,
+        resync_seconds=settings.REMIND_RESYNC_SECONDS,
+        poll_seconds=settings.REMIND_POLL_SECONDS,
+    )
+    lease = LeaderLease(
+        name=f"remind:{shard[0]}/{shard[1]}",
+        ttl_seconds=settings.SCHEDULER_LEASE_SECONDS,
+        renew_seconds=settings.SCHEDULER_LEASE_RENEW_SECONDS,
+        on_elected=timer.start,
+        on_lost=timer.stop,
+    )
+    await lease.start()
+
+    stop = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    except (NotImplementedError, AttributeError):
+        # windows 不支持，Ctrl+C 仍可退出
+        pass
+    try:
+        await stop.wait()
+    finally:
+        await lease.stop()
+        await timer.stop()
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shard", type=parse_shard, required=True, help="i/n: 处理 task id %% n == i 的任务")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.shard))
@@ -0,0 +1,184 @@
+import time
+import typing
+import asyncio
+import secrets
+import datetime
+import logging
+import collections
+from app.models.models import Session
+from app import ulity
+
+_logger = logging.getLogger(__name__)
+
+
+class SessionUser:
+    """session 中缓存的用户信息，校验 session 时不再查询数据库"""
+    __slots__ = ("id", "username", "email")
+
+    def __init__(self, id: int, username: str, email: typing.Optional[str] = None):
+        self.id = id
+        self.username = username
+        self.email = email
+
+
+class SessionStore:
+    """
+    session 存储
+    :param expire_seconds: 过期时间，每次访问后重新计时
+    :param sweep_seconds: 清理过期 session 的间隔
+    """
+    def __init__(self, expire_seconds: int, sweep_seconds: int = 60):
+        self.expire_seconds = expire_seconds
+        self.sweep_seconds = sweep_seconds
+        self._sweeper: typing.Optional[asyncio.Task] = None
+
+    async def start(self):
+        """启动后台清理"""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_seconds)
+            try:
+                await self.sweep()
+            except Exception as err:
+                _logger.exception(f"sweep sessions error: {err}")
+
+    @staticmethod
+    def new_session_id() -> str:
+        return secrets.token_urlsafe(32)
+
+    async def create(self, user: SessionUser) -> str:
+        """创建 session 并返回 session id"""
+        raise NotImplementedError
+
+    async def get(self, session_id: str) -> typing.Optional[SessionUser]:
+        """获取 session 对应的用户，并刷新过期时间；不存在或已过期返回 None"""
+        raise NotImplementedError
+
+    async def delete(self, session_id: str):
+        raise NotImplementedError
+
+    async def update_user(self, user: SessionUser):
+        """用户信息修改后，刷新该用户所有 session 中缓存的用户信息"""
+        raise NotImplementedError
+
+    async def sweep(self) -> int:
+        """删除过期 session，返回删除数量"""
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """
+    进程内 session 存储，LRU + TTL，超过 max_size 时淘汰最久未访问的 session
+    多进程部署时各进程不共享，需使用 DatabaseSessionStore
+    """
+    def __init__(self, expire_seconds: int, sweep_seconds: int = 60, max_size: int = 100000):
+        super().__init__(expire_seconds, sweep_seconds)
+        self.max_size = max_size
+        # session_id -> (user, 过期时间戳)，按访问顺序排列
+        self._sessions: collections.OrderedDict[str, tuple[SessionUser, float]] = collections.OrderedDict()
+
+    async def create(self, user: SessionUser) -> str:
+        session_id = self.new_session_id()
+        self._sessions[session_id] = (user, time.monotonic() + self.expire_seconds)
+        while len(self._sessions) > self.max_size:
+            self._sessions.popitem(last=False)
+        return session_id
+
+    async def get(self, session_id: str) -> typing.Optional[SessionUser]:
+        item = self._sessions.get(session_id)
+        if item is None:
+            return None
+        user, expires_at = item
+        _now = time.monotonic()
+        if _now >= expires_at:
+            del self._sessions[session_id]
+            return None
+        self._sessions[session_id] = (user, _now + self.expire_seconds)
+        self._sessions.move_to_end(session_id)
+        return user
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    async def update_user(self, user: SessionUser):
+        for session_id, (_user, expires_at) in self._sessions.items():
+            if _user.id == user.id:
+                self._sessions[session_id] = (user, expires_at)
+
+    async def sweep(self) -> int:
+        _now = time.monotonic()
+        expired = [session_id for session_id, (_, expires_at) in self._sessions.items() if _now >= expires_at]
+        for session_id in expired:
+            del self._sessions[session_id]
+        return len(expired)
+
+
+class DatabaseSessionStore(SessionStore):
+    """
+    数据库 session 存储，多个 worker 进程共享
+    校验时只按主键查询 session 表，剩余时间不足一半时才写回新的过期时间
+    """
+    async def create(self, user: SessionUser) -> str:
+        session_id = self.new_session_id()
+        await Session.create(
+            id=session_id,
+            user_id=user.id,
+            username=user.username,
+            email=user.email,
+            expires_at=ulity.now() + datetime.timedelta(seconds=self.expire_seconds),
+        )
+        return session_id
+
+    async def get(self, session_id: str) -> typing.Optional[SessionUser]:
+        session = await Session.get_or_none(id=session_id)
+        if session is None:
+            return None
+        _now = ulity.now()
+        if _now >= session.expires_at:
+            await Session.filter(id=session_id).delete()
+            return None
+        # 剩余时间不足一半时刷新
+        if session.expires_at - _now < datetime.timedelta(seconds=self.expire_seconds / 2):
+            await Session.filter(id=session_id).update(
+                expires_at=_now + datetime.timedelta(seconds=self.expire_seconds)
+            )
+        return SessionUser(id=session.user_id, username=session.username, email=session.email)
+
+    async def delete(self, session_id: str):
+        await Session.filter(id=session_id).delete()
+
+    async def update_user(self, user: SessionUser):
+        await Session.filter(user_id=user.id).update(username=user.username, email=user.email)
+
+    async def sweep(self) -> int:
+        return await Session.filter(expires_at__lte=ulity.now()).delete()
+
+
+def create_session_store(
+        backend: str,
+        expire_seconds: int,
+        sweep_seconds: int = 60,
+        max_size: int = 100000,
+) -> SessionStore:
+    """
+    根据配置创建 session 存储
+    :param backend: 'memory' | 'database'
+    """
+    if backend == "memory":
+        return MemorySessionStore(expire_seconds, sweep_seconds, max_size)
+    elif backend == "database":
+        return DatabaseSessionStore(expire_seconds, sweep_seconds)
+    else:
+        raise ValueError(f"unknown session backend: {backend}")
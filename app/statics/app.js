@@ -57,6 +57,31 @@ function showAlert(message, type = 'info') {
     }, 3000);
 }
 
+// 按 X-Next-Cursor 响应头逐页查询，返回全部结果
+async function fetchAllPages(url, params) {
+    const rows = [];
+    let cursor = null;
+    do {
+        const pageParams = new URLSearchParams(params);
+        if (cursor) pageParams.set("cursor", cursor);
+        const response = await fetch(url + "?" + pageParams.toString());
+        if (!response.ok) {
+            throw new Error(await response.text());
+        }
+        rows.push(...await response.json());
+        cursor = response.headers.get("X-Next-Cursor");
+    } while (cursor);
+    return rows;
+}
+
+// 标记单个任务完成的地址，按需计算模式下未写入数据库的任务 id 为 null
+function singleTaskDoneUrl(row) {
+    if (row.id === null) {
+        return `/single_tasks/virtual/${row.task.id}/${row.done_times}/done`;
+    }
+    return `/single_tasks/${row.id}/done`;
+}
+
 function formatDateTime(dateTimeStr) {
     if (!dateTimeStr) return "";
     // 先去掉时区部分（+08:00 或 Z），如果有
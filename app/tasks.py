@@ -0,0 +1,60 @@
+"""
+创建序列任务的输入和构建，web 接口和批量导入共用，不依赖 FastAPI
+"""
+import typing
+from pydantic import BaseModel
+from app.models.models import ScheduledTask
+from app import ulity
+
+# 与 ScheduledTask.name 的长度一致
+NAME_MAX_LENGTH = 100
+
+class TaskIn(BaseModel):
+    name: str
+    message: str = ""
+    start_date: str
+    start_time: str
+    repeat_type: str = "none"
+    repeat_interval: int = -1
+    repeat_times: int = -1
+    advance_days: typing.List[int] = list()
+
+
+def build_scheduled_task(task_in: TaskIn, user_id: int) -> ScheduledTask:
+    """
+    根据输入创建序列任务(未保存)
+    :raise ValueError: 日期时间格式错误 或 提前提醒天数超出范围
+    """
+    if len(task_in.name) > NAME_MAX_LENGTH:
+        raise ValueError(f"任务名称不能超过 {NAME_MAX_LENGTH} 个字符")
+    # 组合日期时间
+    try:
+        start_datetime = ulity.form_datetime(task_in.start_date, task_in.start_time)
+    except ValueError:
+        start_datetime = None
+    if not start_datetime:
+        raise ValueError("日期时间格式错误")
+
+    # 提前提醒天数
+    try:
+        advance_days_mask = ulity.advance_days_mask(task_in.advance_days)
+    except ValueError:
+        raise ValueError(f"提前提醒天数应在 0 到 {ulity.MAX_ADVANCE_DAY} 之间")
+
+    task = ScheduledTask(
+        user_id=user_id,
+        name=task_in.name,
+        message=task_in.message,
+        start_datetime=start_datetime,
+
+        repeat_type=task_in.repeat_type,
+        repeat_interval=task_in.repeat_interval,
+        repeat_times=task_in.repeat_times,
+        advance_days_mask=advance_days_mask,
+
+        current_task_datetime=start_datetime,
+        advance_status_mask=0,
+    )
+    # 下一次提醒时间
+    task.fresh_next_remind_at()
+    return task
@@ -1,29 +1,23 @@
+import os
 import typing
 import base64
+import functools
 import datetime
 import zoneinfo
 import bcrypt
 import asyncio
-import json
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import io
 import jinja2
-import win32com.client as win32
-import traceback
-import pythoncom
-# import smtplib
-# from email.mime.multipart import MIMEMultipart
-# from email.mime.text import MIMEText
-# from email.header import Header
-# from email.utils import formataddr
-# from app.env import settings
 
 
 
-# jinja2环境
+# jinja2环境, 模板只编译一次，不再检查文件修改
 jinja2_env = jinja2.Environment(
-    loader=jinja2.FileSystemLoader("app/statics"),
-    autoescape=True
+    loader=jinja2.FileSystemLoader(os.path.join(os.path.dirname(__file__), "statics")),
+    autoescape=True,
+    auto_reload=False,
 )
 
 
@@ -56,45 +50,52 @@ def form_datetime(date: str, time: str, tz: typing.Optional[str]="Asia/Shanghai"
 ########################################################################
 # 邮件提醒
 ########################################################################
-def dumps_advance_days(days: list) -> str:
-    """
-    将提醒天数列表转换为 json字符串，json list
-    :param days: [1,2,7]
-    :return:  [1,2,7]
-    """
-    days = [int(day) for day in days]
-    return json.dumps(sorted(days))
-
-def loads_advance_days(days: str) -> list:
-    """
-    将 advance_days json字符串（例如 '[1, 2, 7]') 转成整数列表 [1,2,7]
-    :return:
-    """
-    advance_days = json.loads(days)
-    advance_days = [int(day) for day in advance_days]
-    return sorted(advance_days)
+# 提前提醒天数上限，天数保存在 BIGINT 位掩码中
+MAX_ADVANCE_DAY = 62
 
-def init_advance_status(days: typing.Union[str, list]) -> str:
+def advance_days_mask(days: typing.Iterable[int]) -> int:
     """
-    将提醒天数转化为提醒状态 json dict
-    :param days: [1,2,7] | "1,2,7"
-    :return:  {"1": False, "2": False, "7": False,}
+    提醒天数列表转换为位掩码，第 day 位表示提前 day 天
+    :param days: [1,2,7]
+    :return: 0b10000110
     """
-    if isinstance(days, str):
-        days = loads_advance_days(days)
+    mask = 0
+    for day in days:
+        day = int(day)
+        if not 0 <= day <= MAX_ADVANCE_DAY:
+            raise ValueError(f"advance day out of range: {day}")
+        mask |= 1 << day
+    return mask
+
+def iter_mask_days(mask: int) -> typing.Iterator[int]:
+    """从小到大返回位掩码中的天数"""
+    day = 0
+    while mask:
+        if mask & 1:
+            yield day
+        mask >>= 1
+        day += 1
+
+def repeat_type_str(repeat_type: str, repeat_interval: int) -> str:
+    """重复设置的中文描述，例如 每天、间隔2周"""
+    if repeat_interval < 0:
+        return "无"
+
+    if repeat_type == "days":
+        _type = "天"
+    elif repeat_type == "weeks":
+        _type = "周"
+    elif repeat_type == "months":
+        _type = "月"
+    elif repeat_type == "years":
+        _type = "年"
     else:
-        days = [int(day) for day in days]
-        days = sorted(days)
-    status = {day: False for day in days}
-    return dumps_advance_status(status)
-
-def dumps_advance_status(status: dict) -> str:
-    advance_status = json.dumps(status)
-    return advance_status
+        return "无"
 
-def loads_advance_status(status: str) -> dict:
-    _status = json.loads(status)
-    return {int(k): v for k, v in _status.items()}
+    if repeat_interval == 0:
+        return f"每{_type}"
+    else:
+        return f"间隔{repeat_interval}{_type}"
 
 def image_to_data_uri(path: str, max_size=(150, 150)) -> str:
     """将图片压缩到指定大小，并转为 base64 data URI"""
@@ -105,72 +106,26 @@ def image_to_data_uri(path: str, max_size=(150, 150)) -> str:
         encoded = base64.b64encode(buf.getvalue()).decode()
         return f"data:image/png;base64,{encoded}"
 
-# async def send_email_with_smtp(email: str, subject: str, context: typing.Dict, local_image_path: str = None):
-#     """
-#     异步发送 HTML 邮件（使用 asyncio.to_thread 避免阻塞）
-#     :param email:
-#     :param local_image_path:
-#     :param subject: 邮件主题
-#     :param context: 邮件内容字典
-#                     "username": task.user.username,
-#                     "task_name": task.task_name,
-#                     "message": task.message,
-#                     "task_datetime": dt,
-#                     "task_done": task.current_repeat_done,
-#                     "repeat_type": repeat_type,
-#                     "note": "正式提醒"
-#     """
-#     if not settings.SMTP_SERVER or not settings.SMTP_USER or not email:
-#         raise ValueError("用户SMTP或Email未配置")
-#
-#     # 生成图片 data URI
-#     img_data_uri = image_to_data_uri(local_image_path) if local_image_path else ""
-#     context["img_data_uri"] = img_data_uri
-#
-#     # =============== Jinja2 模板渲染 ===============
-#     template = jinja2_env.get_template("/mail.html")
-#     body_html = template.render(context)
-#
-#     # =============== 构建邮件 ===============
-#     msg = MIMEMultipart("alternative")
-#     msg['From'] = formataddr(("Schedule Task Reminder", settings.SMTP_USER))
-#     msg['To'] = formataddr((context.get("username", ""), email))
-#     msg['Subject'] = Header(subject, 'utf-8')
-#
-#     # 纯文本（防止客户端不支持 HTML）
-#     text_part = MIMEText("任务提醒，请查看邮件内容。", "plain", "utf-8")
-#     html_part = MIMEText(body_html, "html", "utf-8")
-#
-#     msg.attach(text_part)
-#     msg.attach(html_part)
-#
-#     # =============== 同步发送函数（放到线程池） ===============
-#     def _send():
-#         with smtplib.SMTP_SSL(settings.SMTP_SERVER,settings.SMTP_PORT) as server:
-#             server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-#             server.sendmail(settings.SMTP_USER, [email,], msg.as_string())
-#             try:
-#                 server.quit()
-#             # 忽略 QQ 邮箱关闭连接时的异常
-#             except smtplib.SMTPResponseException:
-#                 pass
-#
-#     # 使用 asyncio.to_thread 在异步环境下执行同步函数
-#     await asyncio.to_thread(_send)
-
-async def send_email_with_win32(
-        to: typing.Union[str, list[str]],
-        subject: str,
-        context: typing.Dict,
-        local_image_path: typing.Optional[str] = None,
-        cc: typing.Union[str, list[str]] = None,
-        sender: typing.Optional[str] = None,
-):
+@functools.lru_cache(maxsize=16)
+def _cached_image_to_data_uri(path: str, mtime_ns: int, max_size: tuple) -> str:
+    return image_to_data_uri(path, max_size)
+
+def cached_image_to_data_uri(path: str, max_size=(150, 150)) -> str:
+    """image_to_data_uri 的缓存版本，以文件路径 + 修改时间为 key，图片不存在返回空字符串"""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return ""
+    return _cached_image_to_data_uri(path, mtime_ns, tuple(max_size))
+
+@functools.cache
+def get_mail_template() -> jinja2.Template:
+    """邮件模板，编译一次后复用"""
+    return jinja2_env.get_template("/mail.html")
+
+def render_mail_html(context: typing.Dict, local_image_path: typing.Optional[str] = None) -> str:
     """
-    异步发送 HTML 邮件（使用 asyncio.to_thread 避免阻塞）
-    :param to:
-    :param local_image_path:
-    :param subject: 邮件主题
+    渲染邮件 HTML
     :param context: 邮件内容字典
                     "username": task.user.username,
                     "task_name": task.task_name,
@@ -179,59 +134,29 @@ async def send_email_with_win32(
                     "task_done": task.current_repeat_done,
                     "repeat_type": repeat_type,
                     "note": "正式提醒"
-    :param cc:
-    :param sender:
+    :param local_image_path:
     """
     # =============== 生成图片 data URI ===============
-    # todo 图片需要验证，有可能地址不正确
-    img_data_uri = ""
-    # img_data_uri = image_to_data_uri(local_image_path) if local_image_path else ""
-    context["img_data_uri"] = img_data_uri
+    img_data_uri = cached_image_to_data_uri(local_image_path) if local_image_path else ""
 
     # =============== Jinja2 模板渲染 ===============
-    template = jinja2_env.get_template("/mail.html")
-    body_html = template.render(context)
+    return get_mail_template().render(context, img_data_uri=img_data_uri)
 
-    # =============== 同步发送函数（放到线程池） ===============
-    def _send():
+async def render_mail_batch(tasks: typing.List[typing.Dict]) -> typing.List[typing.Union[str, Exception]]:
+    """
+    在线程池中批量渲染邮件 HTML，避免阻塞事件循环
+    :param tasks: 邮件任务列表，见 app.mail.format_mail_task
+    :return: 与 tasks 一一对应，渲染失败的邮件返回异常，不影响其他邮件
+    """
+    def _render_one(task: typing.Dict) -> typing.Union[str, Exception]:
         try:
-            pythoncom.CoInitialize()
-            # 启动 Outlook 应用
-            outlook = win32.Dispatch('outlook.application')
-            # 创建邮件项
-            mail = outlook.CreateItem(0)
-
-            # 设置邮件基本信息
-            mail.Subject = subject
-            mail.BodyFormat = 2  # 2 代表HTML格式
-            mail.HTMLBody = body_html
-
-            if isinstance(to, str):
-                mail.To = to
-            else:
-                mail.To = ";".join(to)
-
-            if isinstance(cc, str):
-                mail.CC = cc
-            elif isinstance(cc, list):
-                mail.CC = ";".join(cc)
-
-            # 如果Outlook配置了多个账户，指定发送邮箱
-            if sender:
-                mail.SentOnBehalfOfName = sender
-
-            # 发送邮件
-            mail.Send()
-            print(f"send email successfully")
-
+            return render_mail_html(task["context"], task.get("local_image_path", None))
         except Exception as err:
-            print(f"send email error: {traceback.format_exc()}")
-            raise err
-        finally:
-            pythoncom.CoUninitialize()
+            return err
 
-    # 使用 asyncio.to_thread 在异步环境下执行同步函数
-    await asyncio.to_thread(_send)
+    def _render():
+        return [_render_one(task) for task in tasks]
+    return await asyncio.to_thread(_render)
 
 ########################################################################
 # User
@@ -240,3 +165,47 @@ def get_hashed_pwd(password: str) -> str:
     """密码转换为 hash 值"""
     hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
     return hashed.decode("utf-8")
+
+def is_pwd_correct(password: str, password_hash: str) -> bool:
+    """密码是否正确"""
+    return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+
+class BusyError(Exception):
+    """线程池排队已满"""
+
+class BoundedExecutor:
+    """
+    限制线程数和排队数量的线程池，排队已满时直接抛出 BusyError，不继续堆积
+    """
+    def __init__(self, max_workers: int, max_pending: int, thread_name_prefix: str = ""):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        # 正在执行 + 排队中的数量
+        self._limit = max_workers + max_pending
+        self._running = 0
+
+    async def run(self, func: typing.Callable, *args):
+        if self._running >= self._limit:
+            raise BusyError("executor is busy")
+        self._running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._running -= 1
+
+@functools.cache
+def get_pwd_executor() -> BoundedExecutor:
+    """bcrypt 专用线程池"""
+    from app.env import settings
+    return BoundedExecutor(
+        max_workers=settings.PWD_HASH_WORKERS,
+        max_pending=settings.PWD_HASH_MAX_PENDING,
+        thread_name_prefix="bcrypt",
+    )
+
+async def hash_pwd(password: str) -> str:
+    """在 bcrypt 线程池中计算密码 hash，排队已满时抛出 BusyError"""
+    return await get_pwd_executor().run(get_hashed_pwd, password)
+
+async def check_pwd(password: str, password_hash: str) -> bool:
+    """在 bcrypt 线程池中校验密码，排队已满时抛出 BusyError"""
+    return await get_pwd_executor().run(is_pwd_correct, password, password_hash)
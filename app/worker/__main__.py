@@ -0,0 +1,37 @@
+"""
+独立运行的后台 worker: 邮件发送、待发送邮件分发 和 定时任务，不加载 FastAPI
+
+python -m app.worker
+
+在 .env 中设置 WEB_RUN_WORKER=False 后，web 进程只写入待发送邮件，
+邮件发送和定时任务全部由 worker 处理，两者可以分别扩容
+"""
+import signal
+import asyncio
+import logging
+from tortoise import Tortoise
+from app.models.mysql_config import MYSQL_TORTOISE_ORM
+from app.worker.service import WorkerService
+
+
+async def main():
+    await Tortoise.init(config=MYSQL_TORTOISE_ORM)
+    worker = WorkerService()
+    await worker.start()
+
+    stop = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    except (NotImplementedError, AttributeError):
+        # windows 不支持，Ctrl+C 仍可退出
+        pass
+    try:
+        await stop.wait()
+    finally:
+        await worker.stop()
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
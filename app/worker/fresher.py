@@ -1,107 +1,256 @@
+import time
+import typing
 import datetime
 import logging
-from fastapi import FastAPI
-from app.routers.mail import MailSender, MailInfo, format_mail_task
-from app.models.models import ScheduledTask
+from tortoise.expressions import Q, RawSQL
+from tortoise.queryset import QuerySet
+from tortoise.functions import Max
+from tortoise.transactions import in_transaction
+from app.mail import MailInfo, format_mail_task
+from app.models.models import ScheduledTask, SingleTask, MailOutbox, ImportJob
+from app.models.mysql_config import DEFAULT_CONNECTION
+from app.worker.reminder import ReminderRecord, REMINDER_FIELDS
 from app import ulity
 
 _logger = logging.getLogger(__name__)
 
+# 提醒批量写回的字段
+# 不包含 is_ended / ended_at: 读取后任务可能已被用户结束，自动结束使用单独的条件更新，避免覆盖
+REMIND_FIELDS = (
+    "current_task_datetime",
+    "current_done_times",
+    "advance_status_mask",
+    "next_remind_at",
+)
+# 批量更新每批数量
+BULK_UPDATE_BATCH_SIZE = 500
 
-async def fresh_email_remind(app: FastAPI):
-    """轮询所有任务，发送邮件提醒，一分钟执行一次"""
+# 生成任务实例需要的字段
+GENERATE_FIELDS = (
+    "id",
+    "user_id",
+    "is_ended",
+    "start_datetime",
+    "repeat_type",
+    "repeat_interval",
+    "repeat_times",
+    "current_task_datetime",
+    "current_done_times",
+)
+# 生成未来多少天的任务
+GENERATE_DAYS_AHEAD = 365
+# 批量插入每批数量
+BULK_CREATE_BATCH_SIZE = 1000
+# 生成任务实例时每批读取的任务数
+GENERATE_TASK_BATCH_SIZE = 500
+
+
+def shard_filter(query: QuerySet, shard: typing.Optional[tuple[int, int]]) -> QuerySet:
+    """只保留 id % count == index 的任务"""
+    if shard is None:
+        return query
+    index, count = shard
+    # 带上表名，查询中 join 了 user 表
+    table = query.model._meta.db_table
+    return query.annotate(shard=RawSQL(f"{table}.id % {int(count)}")).filter(shard=index)
+
+
+async def fresh_email_remind(
+        shard: typing.Optional[tuple[int, int]] = None,
+) -> typing.Optional[dict[int, typing.Optional[datetime.datetime]]]:
+    """
+    处理到期任务，写入待发送邮件，由 RemindTimer 在最早的提醒到期时调用
+    :param shard: (index, count) 只处理 id % count == index 的任务，None 处理全部
+    :return: 处理过的任务的下一次提醒时间 {task_id: next_remind_at}，结束的任务为 None; 出错返回 None
+    """
     try:
         _now = ulity.now()
-        # 获取 task
-        tasks = await ScheduledTask.all().prefetch_related("user")
-        # 从 app 中获取发送器
-        mail_sender: MailSender = app.state.mail_sender
-
-        # 轮询
-        for task in tasks:
-            # 任务已经结束
-            if task.is_ended:
-                continue
+        # 获取到期的 task, next_remind_at 为空的任务(旧数据)也一并处理并补全
+        query = ScheduledTask.filter(
+            Q(next_remind_at__lte=_now) | Q(next_remind_at__isnull=True),
+            is_ended=False,
+        )
+        rows = await shard_filter(query, shard).values(*REMINDER_FIELDS)
+        records = [ReminderRecord(row) for row in rows]
+        del rows
+        # 被修改的任务
+        dirty_records = list()
+        # 待发送的邮件: (任务, 邮件信息 除 message 外的字段)
+        pending = list()
+        # 处理过的任务的下一次提醒时间
+        reminded = dict()
 
+        for record in records:
             # 当前任务时间
-            _task_dt = task.current_task_datetime
+            _task_dt = record.current_task_datetime
             if not _task_dt:
                 continue
+            # 修改前快照
+            state = record.state()
 
-            # 获取提醒设置
-            _adv_days = task.advance_days
-            # 获取当前提醒状态
-            _adv_status = task.current_advance_status
-            for day in _adv_days:
-                if day not in _adv_status:
-                    _adv_status[day] = False
             # 正式提醒
             if _now >= _task_dt:
-                if task.user.email:
-                    mail_info = MailInfo(
-                        to=task.user.email,
-                        subject=f"[正式提醒] {task.name}",
-                        username=task.user.username,
-                        task_name=task.name,
-                        message=task.message,
+                if record.user_email:
+                    pending.append((record, dict(
+                        subject=f"[正式提醒] {record.name}",
                         task_datetime=_task_dt,
-                        task_done=task.current_done_times + 1,
-                        repeat_type=task.repeat_type_str,
+                        task_done=record.current_done_times + 1,
                         note="正式提醒",
-                        local_image_path="app/statics/logo.jpg"
-                    )
-                    mail_task = format_mail_task(mail_info)
-                    await mail_sender.add_task(mail_task)
-
+                    )))
                 # 刷新下一次任务
-                task.fresh_next_task()
+                record.fresh_next_task(_now)
             # 提前提醒
             else:
                 delta = _task_dt - _now
-                # 从小到大排列_adv_days
+                # 从小到大
                 # 时间间隔小于等于提醒时间 -> 提醒.跳出循环（实现只提醒一次）
-                for day in _adv_days:
-                    # 提醒
-                    if delta <= datetime.timedelta(days=day) and not _adv_status[day]:
-                        if task.user.email:
-                            mail_info = MailInfo(
-                                to=task.user.email,
-                                subject=f"[提前{day}天] {task.name}",
-                                username=task.user.username,
-                                task_name=task.name,
-                                message=task.message,
+                for day in record.iter_advance_days():
+                    if delta <= datetime.timedelta(days=day) and not record.is_reminded(day):
+                        if record.user_email:
+                            pending.append((record, dict(
+                                subject=f"[提前{day}天] {record.name}",
                                 task_datetime=_task_dt,
-                                task_done=task.current_done_times + 1,
-                                repeat_type=task.repeat_type_str,
+                                task_done=record.current_done_times + 1,
                                 note=f"提前{day}天提醒",
-                                local_image_path="app/statics/logo.jpg"
-                            )
-                            mail_task = format_mail_task(mail_info)
-                            await mail_sender.add_task(mail_task)
-
-                        _adv_status[day] = True
+                            )))
+                        record.mark_reminded(day)
                         break
+            # 刷新下一次提醒时间
+            record.fresh_next_remind_at()
+            reminded[record.id] = record.next_remind_at
+            # 记录被修改的 task
+            if record.state() != state:
+                dirty_records.append(record)
+
+        # 只为需要发送的任务查询 message
+        mails = list()
+        if pending:
+            messages = dict(await ScheduledTask.filter(
+                id__in=list({record.id for record, _ in pending}),
+            ).values_list("id", "message"))
+            for record, info in pending:
+                mail_info = MailInfo(
+                    to=record.user_email,
+                    username=record.username,
+                    task_name=record.name,
+                    message=messages.get(record.id, ""),
+                    repeat_type=record.repeat_type_str,
+                    local_image_path="app/statics/logo.jpg",
+                    **info,
+                )
+                mail_task = format_mail_task(mail_info)
+                mails.append(MailOutbox(task_id=record.id, payload=mail_task, next_attempt_at=_now))
+        dirty_tasks = [record.to_model() for record in dirty_records]
+        # 所有任务都已完成，自动结束
+        ended_records = [record for record in dirty_records if record.is_ended]
 
-                task.set_current_advance_status(_adv_status)
-            # 更新 task
-            await task.save()
+        # 批量更新 task, 同一事务写入待发送邮件
+        if dirty_tasks or mails:
+            async with in_transaction(DEFAULT_CONNECTION):
+                if dirty_tasks:
+                    await ScheduledTask.bulk_update(
+                        dirty_tasks,
+                        fields=REMIND_FIELDS,
+                        batch_size=BULK_UPDATE_BATCH_SIZE,
+                    )
+                for record in ended_records:
+                    await ScheduledTask.filter(id=record.id, is_ended=False).update(
+                        is_ended=True,
+                        ended_at=record.ended_at,
+                        next_remind_at=None,
+                    )
+                if mails:
+                    await MailOutbox.bulk_create(mails, batch_size=BULK_CREATE_BATCH_SIZE)
+        return reminded
     except Exception as err:
-        _logger.exception(f"fresh email reminder error: {err}")
+        _logger.exception(f"fresh email reminder error (shard={shard}): {err}")
+        return None
+
 
-async def fresh_single_tasks():
+async def _insert_single_tasks(single_tasks: list[SingleTask]):
+    """插入一批单个任务，每批单独提交；后台生成(SingleTaskGenerator)已插入的相同任务忽略"""
+    async with in_transaction(DEFAULT_CONNECTION):
+        await SingleTask.bulk_create(single_tasks, batch_size=BULK_CREATE_BATCH_SIZE, ignore_conflicts=True)
+
+
+async def fresh_single_tasks() -> dict:
     """
     刷新single task, 写入数据库，每天执行
-    :return:
+    按 id 分批读取未结束的任务，生成的任务实例每 BULK_CREATE_BATCH_SIZE 个插入并提交一次，
+    内存和单个事务的大小与任务总数无关
+    :return: 统计信息
     """
+    report = {"tasks": 0, "inserted": 0, "seconds": 0.0}
+    begin = time.perf_counter()
     try:
-        # 获取 task
-        tasks = await ScheduledTask.all().prefetch_related("user")
-        # 轮询
-        for task in tasks:
-            # 任务已经结束
-            if task.is_ended:
-                continue
-            # 生成任务实例
-            await task.generate_single_tasks()
+        # 使能时间
+        enable_dt = ulity.now() + datetime.timedelta(days=GENERATE_DAYS_AHEAD)
+        single_tasks = list()
+        last_id = 0
+        while True:
+            # 未结束的 task, 只加载生成任务需要的字段
+            tasks = await ScheduledTask.filter(is_ended=False, id__gt=last_id).order_by("id").limit(
+                GENERATE_TASK_BATCH_SIZE
+            ).only(*GENERATE_FIELDS)
+            if not tasks:
+                break
+            last_id = tasks[-1].id
+            report["tasks"] += len(tasks)
+
+            # 这批 task 已生成的最新任务时间
+            lasts = await SingleTask.filter(task_id__in=[task.id for task in tasks]).annotate(
+                last_datetime=Max("datetime"),
+                last_done_times=Max("done_times"),
+            ).group_by("task_id").values("task_id", "last_datetime", "last_done_times")
+            lasts = {last["task_id"]: last for last in lasts}
+
+            for task in tasks:
+                last = lasts.get(task.id)
+                if last:
+                    single_tasks.extend(task.build_single_tasks(
+                        enable_dt,
+                        last_datetime=last["last_datetime"],
+                        last_done_times=last["last_done_times"],
+                    ))
+                else:
+                    single_tasks.extend(task.build_single_tasks(enable_dt))
+
+                # 分批插入
+                if len(single_tasks) >= BULK_CREATE_BATCH_SIZE:
+                    await _insert_single_tasks(single_tasks)
+                    report["inserted"] += len(single_tasks)
+                    single_tasks = list()
+
+        if single_tasks:
+            await _insert_single_tasks(single_tasks)
+            report["inserted"] += len(single_tasks)
     except Exception as err:
         _logger.exception(f"fresh single tasks error: {err}")
+    finally:
+        report["seconds"] = round(time.perf_counter() - begin, 3)
+        _logger.info(f"fresh single tasks: {report}")
+    return report
+
+
+async def fail_stale_import_jobs(stale_seconds: int = 600) -> int:
+    """
+    导入进程退出后任务会一直停留在 pending / running，
+    超过 stale_seconds 未更新进度的导入任务标记为失败
+    :return: 标记的任务数
+    """
+    try:
+        _now = ulity.now()
+        deadline = _now - datetime.timedelta(seconds=stale_seconds)
+        jobs = await ImportJob.filter(status__in=("pending", "running"), updated_at__lt=deadline).values("id", "errors")
+        for job in jobs:
+            errors = job["errors"] + [{"line": None, "error": "import interrupted"}]
+            # 只更新仍未更新进度的任务，避免覆盖刚刚恢复的导入
+            await ImportJob.filter(
+                id=job["id"], status__in=("pending", "running"), updated_at__lt=deadline,
+            ).update(status="failed", errors=errors, finished_at=_now, updated_at=_now)
+        if jobs:
+            _logger.warning(f"fail stale import jobs: {[job['id'] for job in jobs]}")
+        return len(jobs)
+    except Exception as err:
+        _logger.exception(f"fail stale import jobs error: {err}")
+        return 0
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from app.models.models import ScheduledTask
+from app.worker.fresher import GENERATE_DAYS_AHEAD
+
+_logger = logging.getLogger(__name__)
+
+
+class SingleTaskGenerator:
+    """
+    后台生成单个任务实例: 创建任务时只同步生成最近几天，其余 days_ahead 天由这里的 worker 生成
+    队列满或进程退出时未生成的部分不会丢失，每天的 fresh_single_tasks 会从已生成的最新任务继续补齐
+    """
+    def __init__(self, workers: int = 1, queue_size: int = 1, days_ahead: int = GENERATE_DAYS_AHEAD):
+        """
+        :param workers: 并发生成的 worker 数量
+        :param queue_size: 队列长度，队列满时 submit 直接放弃
+        :param days_ahead: 生成未来多少天的任务
+        """
+        self.workers = max(workers, 1)
+        self.days_ahead = days_ahead
+        self.queue: asyncio.Queue[int] = asyncio.Queue(maxsize=queue_size)
+        self._worker_tasks: list[asyncio.Task] = list()
+
+    def submit(self, task_id: int) -> bool:
+        """加入队列，不等待；队列满时返回 False"""
+        try:
+            self.queue.put_nowait(task_id)
+            return True
+        except asyncio.QueueFull:
+            _logger.warning(f"single task generator queue full, task[{task_id}] deferred to fresh_single_tasks")
+            return False
+
+    async def generate(self, task_id: int):
+        task = await ScheduledTask.get_or_none(id=task_id)
+        if task is None or task.is_ended:
+            return
+        # 从已生成的最新任务之后继续生成
+        await task.generate_single_tasks(days_ahead=self.days_ahead)
+
+    async def _worker(self):
+        while True:
+            task_id = await self.queue.get()
+            try:
+                await self.generate(task_id)
+            except Exception as err:
+                _logger.exception(f"generate single tasks of task[{task_id}] error: {err}")
+            finally:
+                self.queue.task_done()
+
+    async def start(self):
+        if not self._worker_tasks:
+            self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """停止 worker，队列中未处理的任务由 fresh_single_tasks 补齐"""
+        for worker_task in self._worker_tasks:
+            worker_task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = list()
+
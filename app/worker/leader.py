@@ -0,0 +1,119 @@
+import os
+import uuid
+import typing
+import socket
+import asyncio
+import datetime
+import logging
+from tortoise.expressions import Q
+from tortoise.exceptions import IntegrityError
+from app.models.models import Lease
+from app import ulity
+
+_logger = logging.getLogger(__name__)
+
+
+def default_holder() -> str:
+    """当前进程的唯一标识"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaderLease:
+    """
+    基于数据库租约的选主，多个进程中只有持有租约的进程执行定时任务，其余进程热备
+    持有者每 renew_seconds 续约一次，超过 ttl_seconds 未续约时由其他进程接管
+    """
+    def __init__(
+            self,
+            name: str,
+            ttl_seconds: int = 30,
+            renew_seconds: int = 10,
+            holder: typing.Optional[str] = None,
+            on_elected: typing.Optional[typing.Callable[[], typing.Any]] = None,
+            on_lost: typing.Optional[typing.Callable[[], typing.Any]] = None,
+    ):
+        """
+        :param name: 租约名称，同名租约同一时间只有一个持有者
+        :param ttl_seconds: 租约有效期
+        :param renew_seconds: 续约 / 尝试获取的间隔，应小于 ttl_seconds
+        :param holder: 持有者标识，默认 主机名:进程号:随机数
+        :param on_elected: 成为持有者时调用
+        :param on_lost: 失去租约时调用
+        """
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.renew_seconds = renew_seconds
+        self.holder = holder or default_holder()
+        self.on_elected = on_elected
+        self.on_lost = on_lost
+        self.is_leader = False
+        self._loop_task: typing.Optional[asyncio.Task] = None
+
+    async def try_acquire(self) -> bool:
+        """获取或续约，返回是否持有租约"""
+        _now = ulity.now()
+        expires_at = _now + datetime.timedelta(seconds=self.ttl_seconds)
+        # 自己持有 或 已过期 时更新
+        updated = await Lease.filter(
+            Q(holder=self.holder) | Q(expires_at__lt=_now),
+            name=self.name,
+        ).update(holder=self.holder, expires_at=expires_at)
+        if updated:
+            return True
+        # 租约还不存在
+        if await Lease.exists(name=self.name):
+            return False
+        try:
+            await Lease.create(name=self.name, holder=self.holder, expires_at=expires_at)
+            return True
+        except IntegrityError:
+            return False
+
+    async def release(self):
+        """主动释放租约，其他进程下次尝试时即可接管"""
+        await Lease.filter(name=self.name, holder=self.holder).delete()
+
+    async def _set_leader(self, is_leader: bool):
+        if is_leader == self.is_leader:
+            return
+        self.is_leader = is_leader
+        _logger.info(f"lease[{self.name}] {self.holder} {'elected' if is_leader else 'lost'}")
+        callback = self.on_elected if is_leader else self.on_lost
+        if callback is not None:
+            result = callback()
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def renew(self):
+        """尝试一次获取或续约，数据库出错时按失去租约处理"""
+        try:
+            is_leader = await self.try_acquire()
+        except Exception as err:
+            _logger.exception(f"lease[{self.name}] renew error: {err}")
+            is_leader = False
+        await self._set_leader(is_leader)
+
+    async def _renew_loop(self):
+        while True:
+            await self.renew()
+            await asyncio.sleep(self.renew_seconds)
+
+    async def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._renew_loop())
+
+    async def stop(self):
+        """停止续约并释放租约"""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        if self.is_leader:
+            try:
+                await self.release()
+            except Exception as err:
+                _logger.exception(f"lease[{self.name}] release error: {err}")
+            await self._set_leader(False)
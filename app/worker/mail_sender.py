@@ -1,32 +1,99 @@
+import time
+import typing
 import asyncio
-import traceback
-from app.ulity import send_email_with_win32
+import logging
+from app.ulity import render_mail_html, get_mail_template
+from app.worker.transports import MailTransport, MailMessage
 
+_logger = logging.getLogger(__name__)
 
-class MailSender:
+
+class MailStats:
+    """邮件发送统计"""
     def __init__(self):
-        self.queue = asyncio.Queue(maxsize=1)
-        self._worker_task = None
+        # 发送成功 / 失败数量
+        self.sent = 0
+        self.failed = 0
+        # 队列等待时间(秒)
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        # 发送耗时(秒)
+        self.send_latency_total = 0.0
+        self.send_latency_max = 0.0
+        # 队列满时 add_task 被阻塞的次数和时间(秒)
+        self.blocked = 0
+        self.blocked_total = 0.0
+
+    def record_send(self, queue_wait: float, send_latency: float, success: bool):
+        if success:
+            self.sent += 1
+        else:
+            self.failed += 1
+        self.queue_wait_total += queue_wait
+        self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+        self.send_latency_total += send_latency
+        self.send_latency_max = max(self.send_latency_max, send_latency)
+
+    def record_blocked(self, blocked: float):
+        self.blocked += 1
+        self.blocked_total += blocked
+
+    def as_dict(self) -> dict:
+        count = self.sent + self.failed
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "queue_wait_avg": self.queue_wait_total / count if count else 0.0,
+            "queue_wait_max": self.queue_wait_max,
+            "send_latency_avg": self.send_latency_total / count if count else 0.0,
+            "send_latency_max": self.send_latency_max,
+            "blocked": self.blocked,
+            "blocked_total": self.blocked_total,
+        }
+
+
+class MailSender:
+    def __init__(self, transport: MailTransport, workers: int = 1, queue_size: int = 1):
+        """
+        :param transport: 邮件发送方式
+        :param workers: 并发发送的 worker 数量
+        :param queue_size: 队列长度，队列满时 add_task 等待(背压)
+        """
+        self.transport = transport
+        self.workers = max(workers, 1)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self._worker_tasks = list()
+        self.stats = MailStats()
 
     async def start(self):
         """启动后台邮件发送任务"""
-        if self._worker_task is None:
-            self._worker_task = asyncio.create_task(self._worker())
+        if not self._worker_tasks:
+            # 预先编译邮件模板
+            get_mail_template()
+            await self.transport.open()
+            self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
 
     async def stop(self):
-        """停止任务"""
-        await self.queue.put(None)
-        if self._worker_task:
-            await self._worker_task
+        """停止任务，发送完队列中已有的邮件后退出"""
+        # 每个 worker 一个退出信号
+        for _ in self._worker_tasks:
+            await self.queue.put(None)
+        if self._worker_tasks:
+            await asyncio.gather(*self._worker_tasks)
+            self._worker_tasks = list()
+        await self.transport.close()
 
     async def _worker(self):
         while True:
+            item = await self.queue.get()
             try:
-                task = await self.queue.get()
                 # 退出信号
-                if task is None:
+                if item is None:
                     break
 
+                task, enqueued_at, future = item
+                started_at = time.perf_counter()
+                success = False
                 # 发送邮件
                 '''
                 to:
@@ -43,19 +110,65 @@ class MailSender:
                 cc:
                 sender:
                 '''
-                await send_email_with_win32(
-                    to=task["to"],
-                    subject=task["subject"],
-                    context=task["context"],
-                    local_image_path=task.get("local_image_path", None),
-                    cc=task.get("cc", None),
-                    sender=task.get("sender", None),
-                )
-
-            except Exception as err:
-                print(f"send email error: {traceback.format_exc()}")
+                try:
+                    # 已预先渲染的直接使用，否则在线程池中渲染
+                    html = task.get("html", None)
+                    if html is None:
+                        html = await asyncio.to_thread(
+                            render_mail_html, task["context"], task.get("local_image_path", None)
+                        )
+                    await self.transport.send(MailMessage(
+                        to=task["to"],
+                        subject=task["subject"],
+                        html=html,
+                        cc=task.get("cc", None),
+                        sender=task.get("sender", None),
+                    ))
+                    success = True
+                    if future is not None and not future.done():
+                        future.set_result(None)
+                except Exception as err:
+                    _logger.exception(f"send email to {task.get('to')} error: {err}")
+                    if future is not None and not future.done():
+                        future.set_exception(err)
+                finally:
+                    self.stats.record_send(
+                        queue_wait=started_at - enqueued_at,
+                        send_latency=time.perf_counter() - started_at,
+                        success=success,
+                    )
             finally:
                 self.queue.task_done()
 
-    async def add_task(self, task: dict):
-        await self.queue.put(task)
+    async def add_task(self, task: dict, future: typing.Optional[asyncio.Future] = None):
+        """
+        放入发送队列
+        :param task: 邮件任务，见 app.mail.format_mail_task
+        :param future: 发送完成后设置结果，发送失败时设置异常
+        """
+        item = (task, time.perf_counter(), future)
+        # 队列未满直接放入
+        try:
+            self.queue.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            pass
+        # 队列已满，等待并记录阻塞时间
+        blocked_at = time.perf_counter()
+        await self.queue.put(item)
+        self.stats.record_blocked(time.perf_counter() - blocked_at)
+
+    async def send(self, task: dict):
+        """放入发送队列并等待发送完成，发送失败时抛出异常"""
+        future = asyncio.get_running_loop().create_future()
+        await self.add_task(task, future)
+        await future
+
+    def metrics(self) -> dict:
+        """队列和发送统计"""
+        return {
+            "workers": len(self._worker_tasks),
+            "queue_size": self.queue.qsize(),
+            "queue_maxsize": self.queue.maxsize,
+            **self.stats.as_dict(),
+        }
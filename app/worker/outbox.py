@@ -0,0 +1,133 @@
+import typing
+import asyncio
+import datetime
+import logging
+from tortoise.expressions import Q, F
+from tortoise.transactions import in_transaction
+from app.models.models import MailOutbox
+from app.models.mysql_config import DEFAULT_CONNECTION
+from app.worker.mail_sender import MailSender
+from app import ulity
+
+_logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """
+    从 MailOutbox 认领待发送邮件并交给 MailSender 发送，失败按指数退避重试
+    至少发送一次: 认领后进程退出，认领过期后会被重新认领
+    """
+    def __init__(
+            self,
+            mail_sender: MailSender,
+            batch_size: int = 100,
+            max_attempts: int = 5,
+            retry_seconds: int = 60,
+            claim_seconds: int = 600,
+    ):
+        """
+        :param mail_sender: 邮件发送器
+        :param batch_size: 每批认领数量
+        :param max_attempts: 最多尝试次数，超过后标记为 failed
+        :param retry_seconds: 第一次重试的等待时间，之后每次翻倍
+        :param claim_seconds: 认领过期时间，超时未完成的邮件会被重新认领
+        """
+        self.mail_sender = mail_sender
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.claim_seconds = claim_seconds
+
+    async def claim(self) -> list[MailOutbox]:
+        """
+        认领一批到期的邮件，多个进程并发认领时跳过已被锁定的行
+        已达到 max_attempts 的邮件(上次认领后未能记录结果)标记为 failed，不再认领
+        """
+        _now = ulity.now()
+        async with in_transaction(DEFAULT_CONNECTION) as conn:
+            mails = await MailOutbox.filter(
+                Q(status="pending") | Q(status="sending"),
+                next_attempt_at__lte=_now,
+            ).order_by("next_attempt_at").limit(self.batch_size).select_for_update(
+                skip_locked=True
+            ).using_db(conn)
+            exhausted = [mail.id for mail in mails if mail.attempts >= self.max_attempts]
+            if exhausted:
+                await MailOutbox.filter(id__in=exhausted).using_db(conn).update(
+                    status="failed",
+                    last_error="claim expired after max attempts",
+                )
+                mails = [mail for mail in mails if mail.attempts < self.max_attempts]
+            if mails:
+                await MailOutbox.filter(id__in=[mail.id for mail in mails]).using_db(conn).update(
+                    status="sending",
+                    attempts=F("attempts") + 1,
+                    next_attempt_at=_now + datetime.timedelta(seconds=self.claim_seconds),
+                )
+        for mail in mails:
+            mail.attempts += 1
+        return mails
+
+    def retry_delay(self, attempts: int) -> datetime.timedelta:
+        """第 attempts 次失败后的等待时间"""
+        return datetime.timedelta(seconds=self.retry_seconds * 2 ** max(attempts - 1, 0))
+
+    async def dispatch_batch(self) -> int:
+        """发送一批邮件，返回认领数量"""
+        mails = await self.claim()
+        if not mails:
+            return 0
+
+        # 在线程池中批量渲染，渲染失败的邮件按发送失败处理
+        htmls = await ulity.render_mail_batch([mail.payload for mail in mails])
+
+        async def _send(mail: MailOutbox, html: typing.Union[str, Exception]):
+            if isinstance(html, Exception):
+                raise html
+            return await self.mail_sender.send({**mail.payload, "html": html})
+
+        results = await asyncio.gather(
+            *(_send(mail, html) for mail, html in zip(mails, htmls)),
+            return_exceptions=True,
+        )
+
+        _now = ulity.now()
+        sent_ids = [mail.id for mail, result in zip(mails, results) if not isinstance(result, BaseException)]
+        if sent_ids:
+            await MailOutbox.filter(id__in=sent_ids).update(status="sent", sent_at=_now, last_error=None)
+
+        for mail, result in zip(mails, results):
+            if not isinstance(result, BaseException):
+                continue
+            if mail.attempts >= self.max_attempts:
+                await MailOutbox.filter(id=mail.id).update(status="failed", last_error=str(result))
+            else:
+                await MailOutbox.filter(id=mail.id).update(
+                    status="pending",
+                    next_attempt_at=_now + self.retry_delay(mail.attempts),
+                    last_error=str(result),
+                )
+        return len(mails)
+
+    async def dispatch(self):
+        """发送所有到期的邮件"""
+        try:
+            while await self.dispatch_batch() >= self.batch_size:
+                pass
+        except Exception as err:
+            _logger.exception(f"dispatch outbox error: {err}")
+
+    @staticmethod
+    async def enqueue(payload: dict, task_id: typing.Optional[int] = None) -> MailOutbox:
+        """写入一封待发送邮件，由分发进程发送"""
+        return await MailOutbox.create(task_id=task_id, payload=payload, next_attempt_at=ulity.now())
+
+    @staticmethod
+    async def purge(keep_days: int = 7):
+        """删除 keep_days 天前已发送的邮件"""
+        try:
+            deadline = ulity.now() - datetime.timedelta(days=keep_days)
+            deleted = await MailOutbox.filter(status="sent", sent_at__lt=deadline).delete()
+            _logger.info(f"purge outbox: {deleted} mails deleted")
+        except Exception as err:
+            _logger.exception(f"purge outbox error: {err}")
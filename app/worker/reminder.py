@@ -0,0 +1,147 @@
+import typing
+import datetime
+from app.models.models import ScheduledTask
+from app.occurrence import Recurrence
+from app import ulity
+
+# 提醒需要的字段，不加载 message 等大字段，用户信息通过 join 取得
+REMINDER_FIELDS = (
+    "id",
+    "name",
+    "start_datetime",
+    "repeat_type",
+    "repeat_interval",
+    "repeat_times",
+    "advance_days_mask",
+    "current_task_datetime",
+    "current_done_times",
+    "advance_status_mask",
+    "is_ended",
+    "ended_at",
+    "next_remind_at",
+    "user__email",
+    "user__username",
+)
+
+
+class ReminderRecord:
+    """
+    提醒使用的任务快照，只保存提醒需要的字段
+    提前提醒天数和提醒状态为位掩码，第 day 位表示提前 day 天
+    """
+    __slots__ = (
+        "id",
+        "name",
+        "user_email",
+        "username",
+        "start_datetime",
+        "repeat_type",
+        "repeat_interval",
+        "repeat_times",
+        "advance_days",
+        "advance_status",
+        "current_task_datetime",
+        "current_done_times",
+        "is_ended",
+        "ended_at",
+        "next_remind_at",
+    )
+
+    def __init__(self, row: dict):
+        """
+        :param row: REMINDER_FIELDS 对应的字典
+        """
+        self.id: int = row["id"]
+        self.name: str = row["name"]
+        self.user_email: typing.Optional[str] = row["user__email"]
+        self.username: str = row["user__username"]
+        self.start_datetime: datetime.datetime = row["start_datetime"]
+        self.repeat_type: str = row["repeat_type"]
+        self.repeat_interval: int = row["repeat_interval"]
+        self.repeat_times: int = row["repeat_times"]
+        self.advance_days: int = row["advance_days_mask"]
+        self.advance_status: int = row["advance_status_mask"] & self.advance_days
+        self.current_task_datetime: typing.Optional[datetime.datetime] = row["current_task_datetime"]
+        self.current_done_times: int = row["current_done_times"]
+        self.is_ended: bool = row["is_ended"]
+        self.ended_at: typing.Optional[datetime.datetime] = row["ended_at"]
+        self.next_remind_at: typing.Optional[datetime.datetime] = row["next_remind_at"]
+
+    def state(self) -> tuple:
+        """提醒会修改的字段快照，用于判断是否需要写回"""
+        return (
+            self.is_ended,
+            self.ended_at,
+            self.current_task_datetime,
+            self.current_done_times,
+            self.advance_status,
+            self.next_remind_at,
+        )
+
+    @property
+    def repeat_type_str(self) -> str:
+        return ulity.repeat_type_str(self.repeat_type, self.repeat_interval)
+
+    def iter_advance_days(self) -> typing.Iterator[int]:
+        """从小到大的提前提醒天数"""
+        return ulity.iter_mask_days(self.advance_days)
+
+    def is_reminded(self, day: int) -> bool:
+        return bool(self.advance_status >> day & 1)
+
+    def mark_reminded(self, day: int):
+        self.advance_status |= 1 << day
+
+    @property
+    def has_next_task(self) -> bool:
+        """与 ScheduledTask.has_next_task 相同(不重复的任务没有下一次)"""
+        if self.is_ended or self.repeat_interval < 0:
+            return False
+        if 0 < self.repeat_times <= self.current_done_times:
+            return False
+        return True
+
+    def fresh_next_task(self, now: datetime.datetime):
+        """与 ScheduledTask.fresh_next_task 相同: 当前任务时间已过时切换到下一次任务"""
+        cur_task_dt = self.current_task_datetime
+        if cur_task_dt > now:
+            return
+        next_task_dt = None
+        if self.has_next_task:
+            next_task_dt = Recurrence(self.start_datetime, self.repeat_type, self.repeat_interval).after(cur_task_dt)
+        # 任务彻底结束 -> 自动标记为结束任务
+        if next_task_dt is None:
+            self.is_ended = True
+            self.ended_at = cur_task_dt
+        else:
+            self.current_task_datetime = next_task_dt
+            self.current_done_times += 1
+            self.advance_status = 0
+
+    def fresh_next_remind_at(self) -> typing.Optional[datetime.datetime]:
+        """与 ScheduledTask.fresh_next_remind_at 相同"""
+        if self.is_ended or not self.current_task_datetime:
+            self.next_remind_at = None
+            return None
+
+        task_dt = self.current_task_datetime
+        remind_at = task_dt
+        # 未提醒的提前提醒
+        for day in ulity.iter_mask_days(self.advance_days & ~self.advance_status):
+            remind_at = min(remind_at, task_dt - datetime.timedelta(days=day))
+        self.next_remind_at = remind_at
+        return remind_at
+
+    def to_model(self) -> ScheduledTask:
+        """只包含提醒字段的模型实例，用于 bulk_update"""
+        task = ScheduledTask(
+            id=self.id,
+            is_ended=self.is_ended,
+            ended_at=self.ended_at,
+            current_task_datetime=self.current_task_datetime,
+            current_done_times=self.current_done_times,
+            advance_status_mask=self.advance_status,
+            next_remind_at=self.next_remind_at,
+        )
+        task._saved_in_db = True
+        return task
@@ -0,0 +1,136 @@
+import typing
+import datetime
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.job import Job
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from app.env import settings
+from app.worker.mail_sender import MailSender
+from app.worker.transports import create_transport
+from app.worker.outbox import OutboxDispatcher
+from app.worker.leader import LeaderLease
+from app.worker.timer import RemindTimer
+from app.worker import fresher
+from app import ulity
+
+
+class WorkerService:
+    """
+    后台服务: 邮件发送、待发送邮件分发 和 定时任务
+    可以在 web 进程的 lifespan 中运行，也可以通过 python -m app.worker 单独运行
+    多个进程中只有持有租约的进程执行定时任务和提醒; 待发送邮件的分发在所有进程中执行，认领时跳过已被锁定的行
+    """
+    def __init__(self):
+        self.mail_sender = MailSender(
+            transport=create_transport(settings.MAIL_TRANSPORT),
+            workers=settings.MAIL_WORKERS,
+            queue_size=settings.MAIL_QUEUE_SIZE,
+        )
+        self.outbox_dispatcher = OutboxDispatcher(
+            mail_sender=self.mail_sender,
+            batch_size=settings.OUTBOX_BATCH_SIZE,
+            max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+            retry_seconds=settings.OUTBOX_RETRY_SECONDS,
+        )
+        self.scheduler = AsyncIOScheduler()
+        # 提醒定时器，使用 run_worker.py 分片处理时不在这里处理提醒
+        self.remind_timer: typing.Optional[RemindTimer] = None
+        if not settings.REMIND_SHARDED:
+            self.remind_timer = RemindTimer(
+                resync_seconds=settings.REMIND_RESYNC_SECONDS,
+                poll_seconds=settings.REMIND_POLL_SECONDS,
+            )
+        self.lease: typing.Optional[LeaderLease] = None
+        # 只在持有租约时执行的任务
+        self.leader_jobs: list[Job] = list()
+
+    def add_jobs(self):
+        scheduler = self.scheduler
+
+        # 定时任务先以暂停状态添加(next_run_time=None)，获得租约后再执行
+        # 每天04:00:00执行，按需计算模式下不预先生成
+        if settings.SINGLE_TASK_MODE == "eager":
+            self.leader_jobs.append(scheduler.add_job(
+                func=fresher.fresh_single_tasks,
+                trigger=CronTrigger(hour=4, minute=0, second=0),
+                name="fresh_single_tasks",
+                misfire_grace_time=60,
+                coalesce=True,
+                max_instances=1,
+                next_run_time=None,
+            ))
+
+        # 发送待发送邮件
+        scheduler.add_job(
+            func=self.outbox_dispatcher.dispatch,
+            trigger=IntervalTrigger(seconds=settings.OUTBOX_INTERVAL_SECONDS),
+            name="dispatch_outbox",
+            misfire_grace_time=30,
+            coalesce=True,
+            max_instances=1,
+            next_run_time=ulity.now(),
+        )
+
+        # 每天04:30:00执行
+        self.leader_jobs.append(scheduler.add_job(
+            func=OutboxDispatcher.purge,
+            kwargs={"keep_days": settings.OUTBOX_KEEP_DAYS},
+            trigger=CronTrigger(hour=4, minute=30, second=0),
+            name="purge_outbox",
+            misfire_grace_time=60,
+            coalesce=True,
+            max_instances=1,
+            next_run_time=None,
+        ))
+
+        # 获得租约时执行一次，之后按间隔执行: 导入进程退出后遗留的导入任务标记为失败
+        self.leader_jobs.append(scheduler.add_job(
+            func=fresher.fail_stale_import_jobs,
+            kwargs={"stale_seconds": settings.IMPORT_STALE_SECONDS},
+            trigger=IntervalTrigger(seconds=settings.IMPORT_STALE_SECONDS),
+            name="fail_stale_import_jobs",
+            misfire_grace_time=60,
+            coalesce=True,
+            max_instances=1,
+            next_run_time=None,
+        ))
+
+    def resume_leader_jobs(self):
+        """获得租约: 立即执行一次，之后按触发器执行"""
+        for job in self.leader_jobs:
+            job.modify(next_run_time=ulity.now())
+        if self.remind_timer is not None:
+            self.remind_timer.start()
+
+    async def pause_leader_jobs(self):
+        for job in self.leader_jobs:
+            job.pause()
+        if self.remind_timer is not None:
+            await self.remind_timer.stop()
+
+    def schedule_remind(self, task_id: int, remind_at: typing.Optional[datetime.datetime]):
+        """任务的下一次提醒时间被修改，未持有租约时忽略"""
+        if self.remind_timer is not None:
+            self.remind_timer.schedule(task_id, remind_at)
+
+    async def start(self):
+        await self.mail_sender.start()
+
+        self.add_jobs()
+        self.scheduler.start()
+        self.lease = LeaderLease(
+            name="scheduler",
+            ttl_seconds=settings.SCHEDULER_LEASE_SECONDS,
+            renew_seconds=settings.SCHEDULER_LEASE_RENEW_SECONDS,
+            on_elected=self.resume_leader_jobs,
+            on_lost=self.pause_leader_jobs,
+        )
+        await self.lease.start()
+
+    async def stop(self):
+        if self.lease is not None:
+            await self.lease.stop()
+        if self.remind_timer is not None:
+            await self.remind_timer.stop()
+        self.scheduler.shutdown()
+        await self.mail_sender.stop()
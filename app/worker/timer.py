@@ -0,0 +1,183 @@
+import heapq
+import typing
+import asyncio
+import datetime
+import logging
+from tortoise.expressions import Q
+from app.models.models import ScheduledTask
+from app.worker import fresher
+from app import ulity
+
+_logger = logging.getLogger(__name__)
+
+
+class RemindTimer:
+    """
+    提醒定时器: 以最小堆保存每个任务的下一次提醒时间，睡眠到最早的提醒到期后处理到期任务
+    只加载 resync_seconds * 2 内到期的提醒，每 resync_seconds 从数据库重新加载一次；
+    其他进程(例如单独运行的 web)创建的任务写入数据库的 next_remind_at，
+    每 poll_seconds 查询一次即将到期、且不在堆中的任务加入堆；同一进程内的修改通过 schedule / cancel 立即生效
+    """
+    # 处理后仍然到期的任务(例如多个已过期的提前提醒)，至少间隔多久再处理，与原来每分钟轮询一次相同
+    MIN_DELAY = datetime.timedelta(seconds=60)
+
+    def __init__(
+            self,
+            shard: typing.Optional[tuple[int, int]] = None,
+            resync_seconds: int = 60,
+            poll_seconds: int = 5,
+            retry_seconds: int = 5,
+    ):
+        """
+        :param shard: (index, count) 只处理 id % count == index 的任务，None 处理全部
+        :param resync_seconds: 从数据库重新加载的间隔
+        :param poll_seconds: 查询其他进程新增的即将到期提醒的间隔
+        :param retry_seconds: 处理出错后的重试间隔
+        """
+        self.shard = shard
+        self.resync_seconds = resync_seconds
+        self.poll_seconds = poll_seconds
+        self.retry_seconds = retry_seconds
+        # (提醒时间, task_id)，任务修改后旧的记录留在堆中，出堆时与 _due 不一致即丢弃
+        self._heap: list[tuple[datetime.datetime, int]] = list()
+        # task_id -> 当前有效的提醒时间
+        self._due: dict[int, datetime.datetime] = dict()
+        self._resync_at: typing.Optional[datetime.datetime] = None
+        self._poll_at: typing.Optional[datetime.datetime] = None
+        self._wakeup = asyncio.Event()
+        self._loop_task: typing.Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._loop_task is not None
+
+    def __len__(self):
+        return len(self._due)
+
+    def _in_shard(self, task_id: int) -> bool:
+        if self.shard is None:
+            return True
+        index, count = self.shard
+        return task_id % count == index
+
+    def schedule(self, task_id: int, remind_at: typing.Optional[datetime.datetime]):
+        """
+        设置任务的下一次提醒时间，None 表示不再提醒
+        定时器未运行时忽略，启动时会从数据库加载
+        """
+        if not self.is_running or not self._in_shard(task_id):
+            return
+        if remind_at is None:
+            self._due.pop(task_id, None)
+            return
+        if self._due.get(task_id) == remind_at:
+            return
+        self._due[task_id] = remind_at
+        heapq.heappush(self._heap, (remind_at, task_id))
+        # 比当前最早的提醒更早时唤醒
+        if self._heap[0] == (remind_at, task_id):
+            self._wakeup.set()
+
+    def cancel(self, task_id: int):
+        self.schedule(task_id, None)
+
+    def _peek(self) -> typing.Optional[datetime.datetime]:
+        """最早的有效提醒时间，顺便丢弃失效的记录"""
+        heap = self._heap
+        while heap and self._due.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    async def _query_due(self, _now: datetime.datetime, seconds: int) -> dict[int, datetime.datetime]:
+        """数据库中 seconds 内到期的提醒: task_id -> 提醒时间，next_remind_at 为空的任务(旧数据)立即处理并补全"""
+        horizon = _now + datetime.timedelta(seconds=seconds)
+        query = ScheduledTask.filter(
+            Q(next_remind_at__lte=horizon) | Q(next_remind_at__isnull=True),
+            is_ended=False,
+        )
+        rows = await fresher.shard_filter(query, self.shard).values_list("id", "next_remind_at")
+        return {task_id: remind_at or _now for task_id, remind_at in rows}
+
+    async def load(self):
+        """从数据库加载 resync_seconds * 2 内到期的提醒，重建堆"""
+        _now = ulity.now()
+        self._due = await self._query_due(_now, self.resync_seconds * 2)
+        self._heap = [(remind_at, task_id) for task_id, remind_at in self._due.items()]
+        heapq.heapify(self._heap)
+        self._resync_at = _now + datetime.timedelta(seconds=self.resync_seconds)
+        self._poll_at = _now + datetime.timedelta(seconds=self.poll_seconds)
+
+    async def poll(self):
+        """
+        将其他进程新增的、poll_seconds * 2 内到期的提醒加入堆
+        已在堆中的任务不更新，避免覆盖 MIN_DELAY 推迟的提醒时间
+        """
+        _now = ulity.now()
+        for task_id, remind_at in (await self._query_due(_now, self.poll_seconds * 2)).items():
+            if task_id not in self._due:
+                self.schedule(task_id, remind_at)
+        self._poll_at = _now + datetime.timedelta(seconds=self.poll_seconds)
+
+    async def fire(self):
+        """处理到期的任务，并按处理结果更新提醒时间"""
+        fired_at = ulity.now()
+        reminded = await fresher.fresh_email_remind(shard=self.shard)
+        if reminded is None:
+            # 出错，稍后重试
+            await asyncio.sleep(self.retry_seconds)
+            return
+
+        earliest = fired_at + self.MIN_DELAY
+        for task_id, remind_at in reminded.items():
+            if remind_at is not None and remind_at < earliest:
+                remind_at = earliest
+            self.schedule(task_id, remind_at)
+        # 已到期但未被处理的记录，数据库中已不再到期(已结束 或 被其他进程修改)
+        while (remind_at := self._peek()) is not None and remind_at <= fired_at:
+            _, task_id = heapq.heappop(self._heap)
+            self._due.pop(task_id, None)
+
+    async def _run(self):
+        while True:
+            try:
+                self._wakeup.clear()
+                _now = ulity.now()
+                if self._resync_at is None or _now >= self._resync_at:
+                    await self.load()
+                    continue
+                if _now >= self._poll_at:
+                    await self.poll()
+                    continue
+
+                wake_at = min(self._resync_at, self._poll_at)
+                remind_at = self._peek()
+                if remind_at is not None:
+                    if remind_at <= _now:
+                        await self.fire()
+                        continue
+                    wake_at = min(wake_at, remind_at)
+                # 睡眠到最早的提醒 或 下一次查询数据库，schedule 更早的提醒时提前唤醒
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), (wake_at - _now).total_seconds())
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                _logger.exception(f"remind timer error (shard={self.shard}): {err}")
+                await asyncio.sleep(self.retry_seconds)
+
+    def start(self):
+        if self._loop_task is None:
+            self._resync_at = None
+            self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        self._heap, self._due = list(), dict()
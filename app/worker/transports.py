@@ -0,0 +1,258 @@
+import sys
+import typing
+import asyncio
+import mailbox
+import logging
+from email.message import EmailMessage
+from email.utils import formataddr
+import aiosmtplib
+
+_logger = logging.getLogger(__name__)
+
+
+class MailMessage:
+    """渲染完成、待发送的邮件"""
+    __slots__ = ("to", "cc", "sender", "subject", "html")
+
+    def __init__(
+            self,
+            to: typing.Union[str, list[str]],
+            subject: str,
+            html: str,
+            cc: typing.Union[str, list[str], None] = None,
+            sender: typing.Optional[str] = None,
+    ):
+        self.to = [to] if isinstance(to, str) else list(to)
+        if cc is None:
+            self.cc = list()
+        else:
+            self.cc = [cc] if isinstance(cc, str) else list(cc)
+        self.sender = sender
+        self.subject = subject
+        self.html = html
+
+    def to_email(self, default_sender: typing.Optional[str] = None) -> EmailMessage:
+        """转换为标准邮件对象"""
+        msg = EmailMessage()
+        msg["From"] = formataddr(("Schedule Task Reminder", self.sender or default_sender or ""))
+        msg["To"] = ", ".join(self.to)
+        if self.cc:
+            msg["Cc"] = ", ".join(self.cc)
+        msg["Subject"] = self.subject
+        # 纯文本（防止客户端不支持 HTML）
+        msg.set_content("任务提醒，请查看邮件内容。")
+        msg.add_alternative(self.html, subtype="html")
+        return msg
+
+
+class MailTransport:
+    """邮件发送方式"""
+
+    async def open(self):
+        """建立连接等准备工作"""
+
+    async def close(self):
+        """释放资源"""
+
+    async def send(self, message: MailMessage):
+        raise NotImplementedError
+
+
+class SmtpTransport(MailTransport):
+    """
+    SMTP 发送，维护一个已登录的长连接池，多封邮件复用连接
+    """
+    def __init__(
+            self,
+            hostname: str,
+            port: int,
+            username: typing.Optional[str] = None,
+            password: typing.Optional[str] = None,
+            use_tls: bool = True,
+            start_tls: bool = False,
+            pool_size: int = 4,
+            timeout: float = 30,
+            default_sender: typing.Optional[str] = None,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.start_tls = start_tls
+        self.timeout = timeout
+        # 默认发件人，未配置时使用登录用户
+        self.default_sender = default_sender or username
+        self.pool_size = max(pool_size, 1)
+        # 空闲连接
+        self._idle: asyncio.LifoQueue = asyncio.LifoQueue()
+        # 限制同时使用的连接数量
+        self._semaphore = asyncio.Semaphore(self.pool_size)
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        """建立新连接，提供用户名密码时连接后自动登录"""
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            use_tls=self.use_tls,
+            start_tls=self.start_tls,
+            timeout=self.timeout,
+        )
+        await smtp.connect()
+        return smtp
+
+    async def _acquire(self) -> aiosmtplib.SMTP:
+        """取出一个空闲连接，没有则新建"""
+        while not self._idle.empty():
+            smtp = self._idle.get_nowait()
+            if smtp.is_connected:
+                return smtp
+        return await self._connect()
+
+    @staticmethod
+    async def _discard(smtp: aiosmtplib.SMTP):
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def send(self, message: MailMessage):
+        msg = message.to_email(self.default_sender)
+        async with self._semaphore:
+            smtp = await self._acquire()
+            try:
+                try:
+                    await smtp.send_message(msg)
+                # 空闲连接可能已被服务器断开，重连后重试一次
+                except aiosmtplib.SMTPServerDisconnected:
+                    await self._discard(smtp)
+                    smtp = await self._connect()
+                    await smtp.send_message(msg)
+            except Exception:
+                await self._discard(smtp)
+                raise
+            self._idle.put_nowait(smtp)
+
+    async def close(self):
+        while not self._idle.empty():
+            await self._discard(self._idle.get_nowait())
+
+
+class MemoryTransport(MailTransport):
+    """只保存在内存中，用于测试和压测"""
+    def __init__(self):
+        self.messages: list[MailMessage] = list()
+
+    async def send(self, message: MailMessage):
+        self.messages.append(message)
+
+
+class MaildirTransport(MailTransport):
+    """写入本地 Maildir 目录，用于测试和压测"""
+    def __init__(self, path: str):
+        self.path = path
+        self._maildir: typing.Optional[mailbox.Maildir] = None
+
+    async def open(self):
+        self._maildir = mailbox.Maildir(self.path, create=True)
+
+    async def send(self, message: MailMessage):
+        if self._maildir is None:
+            await self.open()
+        msg = message.to_email()
+        await asyncio.to_thread(self._maildir.add, msg)
+
+
+class OutlookTransport(MailTransport):
+    """
+    通过本机 Outlook 发送，仅支持 Windows
+    第一次发送时才导入 pywin32，其他系统上只是每次发送失败，不影响进程启动
+    """
+    def __init__(self):
+        self._pythoncom = None
+        self._win32 = None
+
+    async def open(self):
+        if sys.platform != "win32":
+            _logger.warning("outlook mail transport is only available on Windows, sending emails will fail")
+
+    def _load(self):
+        if self._win32 is not None:
+            return
+        if sys.platform != "win32":
+            raise RuntimeError("outlook mail transport is only available on Windows")
+        # 仅在 Windows 上按需导入
+        import pythoncom
+        import win32com.client
+        self._pythoncom = pythoncom
+        self._win32 = win32com.client
+
+    async def send(self, message: MailMessage):
+        self._load()
+
+        # =============== 同步发送函数（放到线程池） ===============
+        def _send():
+            try:
+                self._pythoncom.CoInitialize()
+                # 启动 Outlook 应用
+                outlook = self._win32.Dispatch('outlook.application')
+                # 创建邮件项
+                mail = outlook.CreateItem(0)
+
+                # 设置邮件基本信息
+                mail.Subject = message.subject
+                mail.BodyFormat = 2  # 2 代表HTML格式
+                mail.HTMLBody = message.html
+                mail.To = ";".join(message.to)
+                if message.cc:
+                    mail.CC = ";".join(message.cc)
+
+                # 如果Outlook配置了多个账户，指定发送邮箱
+                if message.sender:
+                    mail.SentOnBehalfOfName = message.sender
+
+                # 发送邮件
+                mail.Send()
+                _logger.debug(f"send email to {mail.To} successfully")
+
+            except Exception as err:
+                _logger.exception(f"send email via outlook error: {err}")
+                raise err
+            finally:
+                self._pythoncom.CoUninitialize()
+
+        # 使用 asyncio.to_thread 在异步环境下执行同步函数
+        await asyncio.to_thread(_send)
+
+
+def create_transport(name: str) -> MailTransport:
+    """
+    根据配置创建邮件发送方式
+    :param name: 'smtp' | 'outlook' | 'maildir' | 'memory'
+    """
+    from app.env import settings
+
+    if name == "smtp":
+        if not settings.SMTP_SERVER:
+            raise ValueError("SMTP_SERVER 未配置")
+        return SmtpTransport(
+            hostname=settings.SMTP_SERVER,
+            port=settings.SMTP_PORT,
+            username=settings.SMTP_USER,
+            password=settings.SMTP_PASSWORD,
+            use_tls=settings.SMTP_USE_TLS,
+            start_tls=settings.SMTP_START_TLS,
+            pool_size=settings.SMTP_POOL_SIZE,
+            default_sender=settings.SMTP_SENDER,
+        )
+    elif name == "outlook":
+        return OutlookTransport()
+    elif name == "maildir":
+        return MaildirTransport(settings.MAILDIR_PATH)
+    elif name == "memory":
+        return MemoryTransport()
+    else:
+        raise ValueError(f"unknown mail transport: {name}")
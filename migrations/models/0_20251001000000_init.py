@@ -0,0 +1,54 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `user` (
+            `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+            `username` VARCHAR(100) NOT NULL UNIQUE,
+            `password_hash` VARCHAR(200) NOT NULL,
+            `email` VARCHAR(200),
+            `created_at` DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+        ) CHARACTER SET utf8mb4;
+        CREATE TABLE IF NOT EXISTS `scheduledtask` (
+            `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+            `name` VARCHAR(100) NOT NULL,
+            `message` LONGTEXT NOT NULL,
+            `created_at` DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+            `is_ended` BOOL NOT NULL DEFAULT 0,
+            `ended_at` DATETIME(6),
+            `start_datetime` DATETIME(6) NOT NULL,
+            `repeat_type` VARCHAR(20) NOT NULL DEFAULT 'none',
+            `repeat_interval` INT NOT NULL DEFAULT -1,
+            `repeat_times` INT NOT NULL DEFAULT -1,
+            `_advance_days` VARCHAR(100) NOT NULL DEFAULT '',
+            `current_task_datetime` DATETIME(6) NOT NULL,
+            `current_done_times` INT NOT NULL DEFAULT 0,
+            `_current_advance_status` LONGTEXT NOT NULL,
+            `user_id` INT NOT NULL,
+            CONSTRAINT `fk_schedule_user_adb0df83` FOREIGN KEY (`user_id`) REFERENCES `user` (`id`) ON DELETE CASCADE
+        ) CHARACTER SET utf8mb4;
+        CREATE TABLE IF NOT EXISTS `singletask` (
+            `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+            `datetime` DATETIME(6) NOT NULL,
+            `done_times` INT NOT NULL,
+            `remark` LONGTEXT,
+            `repeat_times` INT NOT NULL,
+            `is_done` BOOL NOT NULL DEFAULT 0,
+            `done_at` DATETIME(6),
+            `task_id` INT NOT NULL,
+            `user_id` INT NOT NULL,
+            CONSTRAINT `fk_singleta_schedule_9ec5a3bb` FOREIGN KEY (`task_id`) REFERENCES `scheduledtask` (`id`) ON DELETE CASCADE,
+            CONSTRAINT `fk_singleta_user_9ade00aa` FOREIGN KEY (`user_id`) REFERENCES `user` (`id`) ON DELETE CASCADE
+        ) CHARACTER SET utf8mb4 COMMENT='每次提醒对应的具体时间，支持按日期查询';
+        CREATE TABLE IF NOT EXISTS `aerich` (
+            `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+            `version` VARCHAR(255) NOT NULL,
+            `app` VARCHAR(100) NOT NULL,
+            `content` JSON NOT NULL
+        ) CHARACTER SET utf8mb4;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        """
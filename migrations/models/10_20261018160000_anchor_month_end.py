@@ -0,0 +1,98 @@
+import calendar
+import datetime
+from tortoise import BaseDBAsyncClient
+
+# 每批处理的任务数
+BATCH_SIZE = 1000
+# 按月计算的重复类型 -> 每个周期的月数，与 app/occurrence.py 相同
+MONTH_REPEAT_MONTHS = {
+    "months": 1,
+    "years": 12,
+}
+
+
+def _add_months(dt: datetime.datetime, months: int) -> datetime.datetime:
+    """与 app.occurrence.add_months 相同: 日期超出目标月份天数时取该月最后一天"""
+    total = dt.year * 12 + dt.month - 1 + months
+    year, month = divmod(total, 12)
+    month += 1
+    day = min(dt.day, calendar.monthrange(year, month)[1])
+    return dt.replace(year=year, month=month, day=day)
+
+
+def _placeholder(db: BaseDBAsyncClient) -> str:
+    return "?" if db.capabilities.dialect == "sqlite" else "%s"
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    """
+    旧实现按月/年重复时从当前任务时间逐次累加，月末截断会累积(1月31日 -> 2月28日 -> 3月28日)，
+    现在第 k 次任务时间以 start_datetime 为基准直接计算(1月31日 -> 2月28日 -> 3月31日)
+
+    只有 29-31 日开始的按月/年任务会偏移，将其中未结束任务的当前任务时间和未完成的单个任务
+    修正为基准时间，next_remind_at 置空，由下一次提醒重新计算
+    """
+    p = _placeholder(db)
+    last_id = 0
+    while True:
+        rows = await db.execute_query_dict(
+            f"SELECT `id`, `start_datetime`, `repeat_type`, `repeat_interval`, `current_task_datetime`, "
+            f"`current_done_times` FROM `scheduledtask` "
+            f"WHERE `id` > {p} AND `is_ended` = 0 AND `repeat_interval` >= 0 AND `repeat_type` IN ('months', 'years') "
+            f"ORDER BY `id` LIMIT {BATCH_SIZE}",
+            [last_id],
+        )
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+
+        # 可能偏移的任务: task_id -> (start_datetime, 每个周期的月数, 当前完成次数)
+        tasks = {
+            row["id"]: (
+                row["start_datetime"],
+                MONTH_REPEAT_MONTHS[row["repeat_type"]] * (row["repeat_interval"] + 1),
+                row["current_done_times"],
+            )
+            for row in rows if row["start_datetime"].day > 28
+        }
+        if not tasks:
+            continue
+
+        # 当前任务: 第 current_done_times 次(从 0 开始)
+        task_values = list()
+        for row in rows:
+            if row["id"] not in tasks:
+                continue
+            start, months, done_times = tasks[row["id"]]
+            anchored = _add_months(start, months * done_times)
+            if anchored != row["current_task_datetime"]:
+                task_values.append([anchored, row["id"]])
+        if task_values:
+            await db.execute_many(
+                f"UPDATE `scheduledtask` SET `current_task_datetime` = {p}, `next_remind_at` = NULL WHERE `id` = {p}",
+                task_values,
+            )
+
+        # 未完成的当前及后续单个任务: done_times 从 1 开始
+        single_rows = await db.execute_query_dict(
+            f"SELECT `id`, `task_id`, `datetime`, `done_times` FROM `singletask` "
+            f"WHERE `is_done` = 0 AND `task_id` IN ({', '.join([p] * len(tasks))})",
+            list(tasks),
+        )
+        single_values = list()
+        for row in single_rows:
+            start, months, done_times = tasks[row["task_id"]]
+            if row["done_times"] <= done_times:
+                continue
+            anchored = _add_months(start, months * (row["done_times"] - 1))
+            if anchored != row["datetime"]:
+                single_values.append([anchored, row["id"]])
+        if single_values:
+            await db.execute_many(f"UPDATE `singletask` SET `datetime` = {p} WHERE `id` = {p}", single_values)
+
+    return ""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    # 旧实现的偏移无法还原，修正后的时间同样可以被旧实现使用
+    return ""
@@ -0,0 +1,14 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    # 已有导入任务的 updated_at 为升级时间，其中未结束的任务在 IMPORT_STALE_SECONDS 后标记为失败
+    return """
+        ALTER TABLE `importjob` ADD `updated_at` DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
+        ALTER TABLE `importjob` ADD INDEX `idx_importjob_status_c07fc2` (`status`, `updated_at`);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `importjob` DROP INDEX `idx_importjob_status_c07fc2`;
+        ALTER TABLE `importjob` DROP COLUMN `updated_at`;"""
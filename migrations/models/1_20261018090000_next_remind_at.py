@@ -0,0 +1,14 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    # 已有任务的 next_remind_at 为空，提醒时一并处理并补全
+    return """
+        ALTER TABLE `scheduledtask` ADD `next_remind_at` DATETIME(6);
+        ALTER TABLE `scheduledtask` ADD INDEX `idx_scheduledta_is_ende_d36809` (`is_ended`, `next_remind_at`);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `scheduledtask` DROP INDEX `idx_scheduledta_is_ende_d36809`;
+        ALTER TABLE `scheduledtask` DROP COLUMN `next_remind_at`;"""
@@ -0,0 +1,23 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `mailoutbox` (
+            `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+            `payload` JSON NOT NULL,
+            `status` VARCHAR(10) NOT NULL DEFAULT 'pending',
+            `attempts` INT NOT NULL DEFAULT 0,
+            `next_attempt_at` DATETIME(6) NOT NULL,
+            `last_error` LONGTEXT,
+            `created_at` DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+            `sent_at` DATETIME(6),
+            `task_id` INT,
+            CONSTRAINT `fk_mailoutb_schedule_5a97c474` FOREIGN KEY (`task_id`) REFERENCES `scheduledtask` (`id`) ON DELETE CASCADE,
+            KEY `idx_mailoutbox_status_a1c9f4` (`status`, `next_attempt_at`)
+        ) CHARACTER SET utf8mb4 COMMENT='待发送的提醒邮件，与任务状态在同一事务中写入，保证进程重启后不丢失';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `mailoutbox`;"""
@@ -0,0 +1,19 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `session` (
+            `id` VARCHAR(64) NOT NULL PRIMARY KEY,
+            `username` VARCHAR(100) NOT NULL,
+            `email` VARCHAR(200),
+            `expires_at` DATETIME(6) NOT NULL,
+            `user_id` INT NOT NULL,
+            CONSTRAINT `fk_session_user_4e399dc8` FOREIGN KEY (`user_id`) REFERENCES `user` (`id`) ON DELETE CASCADE,
+            KEY `idx_session_expires_823c67` (`expires_at`)
+        ) CHARACTER SET utf8mb4 COMMENT='登录 session，缓存用户信息，校验时不再查询用户表';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `session`;"""
@@ -0,0 +1,15 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `singletask` ADD INDEX `idx_singletask_user_id_401072` (`user_id`, `datetime`, `is_done`);
+        ALTER TABLE `singletask` ADD INDEX `idx_singletask_task_id_af3e9c` (`task_id`, `datetime`);
+        ALTER TABLE `scheduledtask` ADD INDEX `idx_scheduledta_user_id_96da75` (`user_id`, `start_datetime`);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `scheduledtask` DROP INDEX `idx_scheduledta_user_id_96da75`;
+        ALTER TABLE `singletask` DROP INDEX `idx_singletask_task_id_af3e9c`;
+        ALTER TABLE `singletask` DROP INDEX `idx_singletask_user_id_401072`;"""
@@ -0,0 +1,19 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `tasknamegram` (
+            `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+            `gram` VARCHAR(2) NOT NULL,
+            `task_id` INT NOT NULL,
+            `user_id` INT NOT NULL,
+            CONSTRAINT `fk_taskname_schedule_2ad10b43` FOREIGN KEY (`task_id`) REFERENCES `scheduledtask` (`id`) ON DELETE CASCADE,
+            CONSTRAINT `fk_taskname_user_a13ca1dd` FOREIGN KEY (`user_id`) REFERENCES `user` (`id`) ON DELETE CASCADE,
+            KEY `idx_tasknamegra_user_id_0dbc8a` (`user_id`, `gram`)
+        ) CHARACTER SET utf8mb4 COMMENT='任务名称的二元分词，用于按名称搜索任务，代替 LIKE 模糊查询';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `tasknamegram`;"""
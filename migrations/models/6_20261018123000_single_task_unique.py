@@ -0,0 +1,15 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    # 已有数据中可能存在相同的任务，每组 (task_id, done_times) 保留已完成的、其次 id 最小的一条
+    return """
+        DELETE `s1` FROM `singletask` `s1`
+            JOIN `singletask` `s2` ON `s2`.`task_id` = `s1`.`task_id` AND `s2`.`done_times` = `s1`.`done_times`
+            AND (`s2`.`is_done` > `s1`.`is_done` OR (`s2`.`is_done` = `s1`.`is_done` AND `s2`.`id` < `s1`.`id`));
+        ALTER TABLE `singletask` ADD UNIQUE INDEX `uid_singletask_task_id_75a45d` (`task_id`, `done_times`);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `singletask` DROP INDEX `uid_singletask_task_id_75a45d`;"""
@@ -0,0 +1,15 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `lease` (
+            `name` VARCHAR(64) NOT NULL PRIMARY KEY,
+            `holder` VARCHAR(128) NOT NULL,
+            `expires_at` DATETIME(6) NOT NULL
+        ) CHARACTER SET utf8mb4 COMMENT='进程间租约，用于选出唯一执行定时任务的进程';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `lease`;"""
@@ -0,0 +1,113 @@
+import json
+from tortoise import BaseDBAsyncClient
+
+# 每批转换的任务数
+BATCH_SIZE = 1000
+# 位掩码为 BIGINT，超出的天数无法保存，转换时丢弃
+MAX_ADVANCE_DAY = 62
+
+
+def _loads_days(value: str) -> list[int]:
+    """旧格式的提前提醒天数: '[1, 2, 7]'，更早的数据为 '1,2,7' 或 ''"""
+    try:
+        days = json.loads(value)
+    except ValueError:
+        days = [day for day in value.split(",") if day.strip()]
+    if not isinstance(days, list):
+        return list()
+    result = list()
+    for day in days:
+        try:
+            day = int(day)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= day <= MAX_ADVANCE_DAY:
+            result.append(day)
+    return result
+
+
+def _loads_status(value: str) -> dict[int, bool]:
+    """旧格式的提前提醒状态: '{"1": true, "7": false}'"""
+    try:
+        status = json.loads(value)
+    except ValueError:
+        return dict()
+    if not isinstance(status, dict):
+        return dict()
+    return {int(day): bool(done) for day, done in status.items() if str(day).strip().isdigit()}
+
+
+def _mask(days) -> int:
+    mask = 0
+    for day in days:
+        mask |= 1 << day
+    return mask
+
+
+def _placeholder(db: BaseDBAsyncClient) -> str:
+    return "?" if db.capabilities.dialect == "sqlite" else "%s"
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    await db.execute_script("""
+        ALTER TABLE `scheduledtask` ADD `advance_days_mask` BIGINT NOT NULL DEFAULT 0;
+        ALTER TABLE `scheduledtask` ADD `advance_status_mask` BIGINT NOT NULL DEFAULT 0;""")
+
+    # 将 JSON 字符串转换为位掩码
+    p = _placeholder(db)
+    last_id = 0
+    while True:
+        rows = await db.execute_query_dict(
+            f"SELECT `id`, `_advance_days`, `_current_advance_status` FROM `scheduledtask` "
+            f"WHERE `id` > {p} ORDER BY `id` LIMIT {BATCH_SIZE}",
+            [last_id],
+        )
+        if not rows:
+            break
+        values = list()
+        for row in rows:
+            days = _loads_days(row["_advance_days"] or "")
+            status = _loads_status(row["_current_advance_status"] or "")
+            values.append([_mask(days), _mask(day for day in days if status.get(day)), row["id"]])
+        await db.execute_many(
+            f"UPDATE `scheduledtask` SET `advance_days_mask` = {p}, `advance_status_mask` = {p} WHERE `id` = {p}",
+            values,
+        )
+        last_id = rows[-1]["id"]
+
+    return """
+        ALTER TABLE `scheduledtask` DROP COLUMN `_advance_days`;
+        ALTER TABLE `scheduledtask` DROP COLUMN `_current_advance_status`;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    await db.execute_script("""
+        ALTER TABLE `scheduledtask` ADD `_advance_days` VARCHAR(100) NOT NULL DEFAULT '';
+        ALTER TABLE `scheduledtask` ADD `_current_advance_status` LONGTEXT;""")
+
+    # 将位掩码转换回 JSON 字符串
+    p = _placeholder(db)
+    last_id = 0
+    while True:
+        rows = await db.execute_query_dict(
+            f"SELECT `id`, `advance_days_mask`, `advance_status_mask` FROM `scheduledtask` "
+            f"WHERE `id` > {p} ORDER BY `id` LIMIT {BATCH_SIZE}",
+            [last_id],
+        )
+        if not rows:
+            break
+        values = list()
+        for row in rows:
+            days = [day for day in range(MAX_ADVANCE_DAY + 1) if row["advance_days_mask"] >> day & 1]
+            status = {day: bool(row["advance_status_mask"] >> day & 1) for day in days}
+            values.append([json.dumps(days), json.dumps(status), row["id"]])
+        await db.execute_many(
+            f"UPDATE `scheduledtask` SET `_advance_days` = {p}, `_current_advance_status` = {p} WHERE `id` = {p}",
+            values,
+        )
+        last_id = rows[-1]["id"]
+
+    return """
+        ALTER TABLE `scheduledtask` MODIFY `_current_advance_status` LONGTEXT NOT NULL;
+        ALTER TABLE `scheduledtask` DROP COLUMN `advance_days_mask`;
+        ALTER TABLE `scheduledtask` DROP COLUMN `advance_status_mask`;"""
@@ -0,0 +1,23 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `importjob` (
+            `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+            `format` VARCHAR(10) NOT NULL,
+            `status` VARCHAR(10) NOT NULL DEFAULT 'pending',
+            `total` INT NOT NULL DEFAULT 0,
+            `imported` INT NOT NULL DEFAULT 0,
+            `failed` INT NOT NULL DEFAULT 0,
+            `errors` JSON NOT NULL,
+            `created_at` DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+            `finished_at` DATETIME(6),
+            `user_id` INT NOT NULL,
+            CONSTRAINT `fk_importjo_user_2ea679ac` FOREIGN KEY (`user_id`) REFERENCES `user` (`id`) ON DELETE CASCADE
+        ) CHARACTER SET utf8mb4 COMMENT='批量导入任务，后台逐批写入，前端轮询进度';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `importjob`;"""
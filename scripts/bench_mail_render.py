@@ -0,0 +1,53 @@
+"""
+邮件渲染性能: 每封邮件重新加载模板、重新压缩图片 与 模板编译一次、图片缓存 的对比
+
+运行: python -m scripts.bench_mail_render
+"""
+import os
+import time
+import asyncio
+import jinja2
+from app import ulity
+
+LOGO_PATH = os.path.join(os.path.dirname(ulity.__file__), "statics", "logo.jpg")
+CONTEXT = {
+    "username": "username",
+    "task_name": "任务名称",
+    "message": "任务内容",
+    "task_datetime": "2025-10-01 09:00",
+    "task_done": 1,
+    "repeat_type": "每天",
+    "note": "正式提醒",
+}
+
+
+def render_before(context: dict) -> str:
+    """旧方式: 每封邮件 get_template(检查文件修改) 并重新生成图片"""
+    env = ulity.jinja2_env.overlay(auto_reload=True, cache_size=0)
+    template = env.get_template("/mail.html")
+    return template.render(context, img_data_uri=ulity.image_to_data_uri(LOGO_PATH))
+
+
+def render_after(context: dict) -> str:
+    return ulity.render_mail_html(context, LOGO_PATH)
+
+
+def bench(func, number: int) -> float:
+    begin = time.perf_counter()
+    for _ in range(number):
+        func(dict(CONTEXT))
+    return number / (time.perf_counter() - begin)
+
+
+async def bench_batch(number: int) -> float:
+    tasks = [{"context": dict(CONTEXT), "local_image_path": LOGO_PATH} for _ in range(number)]
+    begin = time.perf_counter()
+    await ulity.render_mail_batch(tasks)
+    return number / (time.perf_counter() - begin)
+
+
+if __name__ == "__main__":
+    assert render_before(dict(CONTEXT)) == render_after(dict(CONTEXT))
+    print(f"before: {bench(render_before, 200):10.0f} renders/s")
+    print(f"after:  {bench(render_after, 5000):10.0f} renders/s")
+    print(f"batch:  {asyncio.run(bench_batch(5000)):10.0f} renders/s (thread pool)")
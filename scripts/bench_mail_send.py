@@ -0,0 +1,88 @@
+"""
+邮件发送吞吐量: 在本机启动 aiosmtpd 作为 SMTP 服务器，通过 SmtpTransport + MailSender 发送 n 封邮件，
+对比 1 个 worker(1 个连接) 与 N 个 worker(N 个连接) 的每秒发送数量
+
+需要 aiosmtpd (不是项目依赖): uv pip install aiosmtpd
+运行: python -m scripts.bench_mail_send --mails 500 --workers 8 --delay-ms 20
+"""
+import time
+import socket
+import asyncio
+import argparse
+from app.worker.mail_sender import MailSender
+from app.worker.transports import SmtpTransport
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    raise SystemExit("需要 aiosmtpd: uv pip install aiosmtpd")
+
+# 已渲染的邮件内容，只测量发送
+HTML = "<html><body>" + "任务内容 " * 200 + "</body></html>"
+
+
+class CountingHandler:
+    """接收邮件并计数，delay 模拟服务器处理每封邮件的耗时"""
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+        return "250 Message accepted for delivery"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def bench(port: int, mails: int, workers: int) -> float:
+    """发送 mails 封邮件，返回每秒发送数量"""
+    transport = SmtpTransport(
+        hostname="127.0.0.1",
+        port=port,
+        use_tls=False,
+        start_tls=False,
+        pool_size=workers,
+        default_sender="bench@localhost",
+    )
+    sender = MailSender(transport=transport, workers=workers, queue_size=mails)
+    await sender.start()
+    try:
+        tasks = [
+            {"to": f"user{i}@localhost", "subject": f"bench {i}", "html": HTML}
+            for i in range(mails)
+        ]
+        begin = time.perf_counter()
+        await asyncio.gather(*(sender.send(task) for task in tasks))
+        return mails / (time.perf_counter() - begin)
+    finally:
+        await sender.stop()
+
+
+def main(mails: int, workers: int, delay_ms: float):
+    handler = CountingHandler(delay_ms / 1000)
+    port = free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        for count in (1, workers):
+            received = handler.received
+            rate = asyncio.run(bench(port, mails, count))
+            assert handler.received - received == mails, "smtp server did not receive every mail"
+            print(f"workers={count:<3d} {rate:10.1f} mails/s")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mails", type=int, default=500, help="每轮发送的邮件数量")
+    parser.add_argument("--workers", type=int, default=8, help="与 1 个 worker 对比的 worker 数量")
+    parser.add_argument("--delay-ms", type=float, default=20, help="SMTP 服务器处理每封邮件的耗时(毫秒)")
+    args = parser.parse_args()
+    main(args.mails, args.workers, args.delay_ms)
@@ -0,0 +1,323 @@
+"""
+周期任务时间计算: 旧实现(逐次累加) 与 直接计算(app.occurrence.Recurrence) 的等价性检查和性能对比,
+以及一次性批量生成任务时间的性能
+
+运行: python -m scripts.bench_occurrence
+"""
+import typing
+import random
+import asyncio
+import calendar
+import timeit
+import datetime
+import zoneinfo
+from dateutil import relativedelta
+from tortoise import Tortoise
+from app.occurrence import Recurrence
+from app import ulity
+
+TZ = zoneinfo.ZoneInfo("Asia/Shanghai")
+REPEAT_TYPES = ("days", "weeks", "months", "years")
+
+
+class LegacyTask:
+    """
+    改动前 ScheduledTask 的任务时间计算，以下方法逐字复制自基线版本的 app/models/models.py
+    任务状态(current_task_datetime / current_done_times)由 advance() 按旧实现逐次推进得到
+    """
+    def __init__(self, start_datetime: datetime.datetime, repeat_type: str, repeat_interval: int, repeat_times: int):
+        self.start_datetime = start_datetime
+        self.repeat_type = repeat_type
+        self.repeat_interval = repeat_interval
+        self.repeat_times = repeat_times
+        self.current_task_datetime = start_datetime
+        self.current_done_times = 0
+        self.is_ended = False
+
+    def advance(self) -> bool:
+        """与旧 fresh_next_task 相同地切换到下一次任务(不比较当前时间)，任务结束返回 False"""
+        next_task_dt = self.next_single_task_datetime()
+        if next_task_dt is None:
+            self.is_ended = True
+            return False
+        self.current_task_datetime = next_task_dt
+        self.current_done_times += 1
+        return True
+
+    @property
+    def is_alive(self) -> bool:
+        # 任务已经标记结束
+        if self.is_ended:
+            return False
+        # 1. 设置了重复次数要求
+        # 2. 当前重复次数大于要求
+        if 0 < self.repeat_times <= self.current_done_times:
+            return False
+        # 不重复，且 当前时间大于任务时间
+        if self.repeat_interval < 0 and ulity.now() > self.current_task_datetime:
+            return False
+        return True
+
+    @property
+    def has_next_task(self):
+        # 不存活
+        if not self.is_alive:
+            return False
+        # 不重复
+        if self.repeat_interval < 0:
+            return False
+        return True
+
+    def next_datetime(self, dt: typing.Union[datetime.datetime] = None) -> typing.Optional[datetime.datetime]:
+        """下一个任务时间"""
+        # 不重复
+        if self.repeat_interval < 0:
+            return None
+
+        if dt is None:
+            dt = self.current_task_datetime
+        # 天
+        if self.repeat_type == 'days':
+            return dt + relativedelta.relativedelta(days=self.repeat_interval + 1)
+        # 周
+        elif self.repeat_type == 'weeks':
+            return dt + relativedelta.relativedelta(weeks=self.repeat_interval + 1)
+        # 月
+        elif self.repeat_type == 'months':
+            return dt + relativedelta.relativedelta(months=self.repeat_interval + 1)
+        # 年
+        elif self.repeat_type == 'years':
+            return dt + relativedelta.relativedelta(years=self.repeat_interval + 1)
+        # 无效
+        else:
+            return None
+
+    def last_datetime(self, dt: typing.Union[datetime.datetime] = None) -> typing.Optional[datetime.datetime]:
+        """前一个任务时间"""
+        if dt is None:
+            dt = self.current_task_datetime
+
+        # 天
+        if self.repeat_type == 'days':
+            last_dt =  dt - relativedelta.relativedelta(days=self.repeat_interval + 1)
+            threshold = self.start_datetime - relativedelta.relativedelta(days=self.repeat_interval + 1)
+        # 周
+        elif self.repeat_type == 'weeks':
+            last_dt =  dt - relativedelta.relativedelta(weeks=self.repeat_interval + 1)
+            threshold = self.start_datetime - relativedelta.relativedelta(weeks=self.repeat_interval + 1)
+        # 月
+        elif self.repeat_type == 'months':
+            last_dt =  dt - relativedelta.relativedelta(months=self.repeat_interval + 1)
+            threshold = self.start_datetime - relativedelta.relativedelta(months=self.repeat_interval + 1)
+        # 年
+        elif self.repeat_type == 'years':
+            last_dt =  dt - relativedelta.relativedelta(years=self.repeat_interval + 1)
+            threshold = self.start_datetime - relativedelta.relativedelta(years=self.repeat_interval + 1)
+        # 无效
+        else:
+            return None
+
+        if last_dt >= threshold:
+            return last_dt
+        else:
+            return None
+
+    def next_single_task_datetime(self, start_dt: typing.Union[datetime.datetime] = None) -> typing.Optional[datetime.datetime]:
+        """
+        获取下一次任务时间
+        :param start_dt:   起始时间，如果是None，从task.current_task_datetime开始
+        :return:
+        """
+        # todo 优化两个 while true
+        if start_dt is None:
+            # 没有下一个任务
+            if not self.has_next_task:
+                return None
+            else:
+                return self.next_datetime()
+        else:
+            # 小于任务起始时间 -> start_datetime
+            if start_dt < self.start_datetime:
+                return self.start_datetime
+            # 大于等于任务起始时间
+            else:
+                # 不重复
+                if self.repeat_interval < 0:
+                    return None
+                else:
+                    # 当前任务时间
+                    cur_dt = self.current_task_datetime
+                    # 当前重复次数
+                    cur_times = self.current_done_times
+
+                    # 小于当前时间
+                    if start_dt < cur_dt:
+                        while True:
+                            last_dt = self.last_datetime(cur_dt)
+                            # 没有前一个任务
+                            if last_dt is None:
+                                return None
+                            else:
+                                # 前一个任务 小于等于 start_dt
+                                if last_dt <= start_dt:
+                                    return cur_dt
+                                else:
+                                    cur_dt = last_dt
+                    # 大于等于当前时间
+                    else:
+                        # 没有下一个任务
+                        if not self.has_next_task:
+                            return None
+                        else:
+                            while True:
+                                next_dt = self.next_datetime(cur_dt)
+                                cur_times += 1
+                                # 超过重复需求
+                                if 0 < self.repeat_times <= cur_times:
+                                    return None
+                                else:
+                                    # 下一个任务时间 大于 起始时间
+                                    if next_dt > start_dt:
+                                        return next_dt
+                                    else:
+                                        cur_dt = next_dt
+
+
+def anchored_nth(start: datetime.datetime, repeat_type: str, repeat_interval: int, k: int):
+    """以 start 为基准的第 k 次任务时间(月末截断不累积)"""
+    return start + relativedelta.relativedelta(**{repeat_type: (repeat_interval + 1) * k})
+
+
+def clamps_month_end(start: datetime.datetime, repeat_type: str) -> bool:
+    """按月/年重复且开始日期可能被月末截断(29-31日 / 2月29日)，旧实现逐次累加会产生偏移"""
+    if repeat_type == "months":
+        return start.day > 28
+    if repeat_type == "years":
+        return (start.month, start.day) == (2, 29)
+    return False
+
+
+def random_case(rng: random.Random):
+    start = datetime.datetime(2000, 1, 1, tzinfo=TZ) + datetime.timedelta(
+        days=rng.randrange(365 * 30), minutes=rng.randrange(24 * 60)
+    )
+    # 月末开始的任务单独加大比例
+    if rng.random() < 0.2:
+        start = start.replace(day=rng.randint(28, calendar.monthrange(start.year, start.month)[1]))
+    repeat_type = rng.choice(REPEAT_TYPES)
+    repeat_interval = rng.randrange(4)
+    repeat_times = rng.choice((-1, -1, rng.randrange(1, 30)))
+    return start, repeat_type, repeat_interval, repeat_times
+
+
+def scheduled_task(legacy: LegacyTask):
+    """与 legacy 状态相同的 ScheduledTask(不写入数据库)"""
+    from app.models.models import ScheduledTask
+    return ScheduledTask(
+        start_datetime=legacy.start_datetime,
+        repeat_type=legacy.repeat_type,
+        repeat_interval=legacy.repeat_interval,
+        repeat_times=legacy.repeat_times,
+        current_task_datetime=legacy.current_task_datetime,
+        current_done_times=legacy.current_done_times,
+        is_ended=legacy.is_ended,
+    )
+
+
+async def init_models():
+    """按应用的时区配置初始化模型，只用于构造 ScheduledTask，不建表"""
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models.models"]}, use_tz=False, timezone="Asia/Shanghai")
+    await Tortoise.close_connections()
+
+
+def check_equivalence(n: int = 20000, seed: int = 0):
+    """
+    1. Recurrence 的结果是第一个晚于 dt 的任务，且与以 start 为基准的 relativedelta 一致
+    2. 用旧实现把任务推进若干次，再比较旧的和当前的 next_single_task_datetime(包含 repeat_times)，
+       除月末截断的任务外必须完全一致；月末截断的任务统计不一致的次数和状态已偏移的任务数
+    """
+    rng = random.Random(seed)
+    compared, diff, drifted = 0, 0, 0
+    for _ in range(n):
+        start, repeat_type, repeat_interval, repeat_times = random_case(rng)
+        dt = start + datetime.timedelta(days=rng.randrange(-30, 365 * 10), minutes=rng.randrange(24 * 60))
+
+        recurrence = Recurrence(start, repeat_type, repeat_interval)
+        k = recurrence.index_after(dt)
+        got = recurrence.nth(k)
+        assert got > dt, (start, repeat_type, repeat_interval, dt)
+        assert k == 0 or recurrence.nth(k - 1) <= dt, (start, repeat_type, repeat_interval, dt)
+        assert got == anchored_nth(start, repeat_type, repeat_interval, k), (start, repeat_type, repeat_interval, dt)
+
+        # 旧实现推进到第 steps 次任务
+        legacy = LegacyTask(start, repeat_type, repeat_interval, repeat_times)
+        for _ in range(rng.randrange(40)):
+            if not legacy.advance():
+                break
+        task = scheduled_task(legacy)
+        clamps = clamps_month_end(start, repeat_type)
+        if clamps and legacy.current_task_datetime != recurrence.nth(legacy.current_done_times):
+            drifted += 1
+            # 迁移 10_anchor_month_end 将已偏移的当前任务时间修正为基准时间，之后按基准时间继续
+            snapped = scheduled_task(legacy)
+            snapped.current_task_datetime = recurrence.nth(legacy.current_done_times)
+            expected = recurrence.nth(legacy.current_done_times + 1) if snapped.has_next_task else None
+            assert snapped.next_single_task_datetime() == expected, (start, repeat_type, repeat_interval)
+
+        # 下一次任务，以及当前任务前后任意时间之后的第一个任务
+        around = legacy.current_task_datetime + datetime.timedelta(days=rng.randrange(-400, 400))
+        for start_dt in (None, dt, around):
+            compared += 1
+            expected = legacy.next_single_task_datetime(start_dt)
+            actual = task.next_single_task_datetime(start_dt)
+            if expected == actual:
+                continue
+            case = (start, repeat_type, repeat_interval, repeat_times, legacy.current_done_times, start_dt)
+            assert clamps, case
+            diff += 1
+    print(
+        f"equivalence: {compared} comparisons ok, "
+        f"month-end tasks differ in {diff} comparisons, {drifted} legacy states already drifted"
+    )
+
+
+def bench():
+    start = datetime.datetime(2015, 1, 31, 9, 0, tzinfo=TZ)
+    dt = datetime.datetime(2025, 10, 1, 9, 0, tzinfo=TZ)
+    for repeat_type in REPEAT_TYPES:
+        recurrence = Recurrence(start, repeat_type, 0)
+        legacy_task = LegacyTask(start, repeat_type, 0, -1)
+        number = 50 if repeat_type == "days" else 500
+        legacy = timeit.timeit(lambda: legacy_task.next_single_task_datetime(dt), number=number) / number
+        direct = timeit.timeit(lambda: recurrence.after(dt), number=number) / number
+        print(f"{repeat_type:>6}: legacy {legacy * 1e6:10.1f} us, direct {direct * 1e6:6.1f} us, x{legacy / direct:.0f}")
+
+
+def bench_between(days_ahead: int = 365):
+    """生成 days_ahead 天的任务时间: 逐个查找下一次 与 一次性生成"""
+    start = datetime.datetime(2020, 1, 31, 9, 0, tzinfo=TZ)
+    now = datetime.datetime(2025, 10, 1, 9, 0, tzinfo=TZ)
+    until = now + datetime.timedelta(days=days_ahead)
+    for repeat_type in REPEAT_TYPES:
+        recurrence = Recurrence(start, repeat_type, 0)
+        first = recurrence.index_after(now)
+
+        def one_by_one():
+            result, dt = list(), recurrence.nth(first)
+            while dt <= until:
+                result.append(dt)
+                dt = recurrence.after(dt)
+            return result
+
+        assert one_by_one() == recurrence.between(first, until)
+        number = 200
+        single = timeit.timeit(one_by_one, number=number) / number
+        batch = timeit.timeit(lambda: recurrence.between(first, until), number=number) / number
+        print(f"{repeat_type:>6}: one by one {single * 1e6:8.1f} us, batch {batch * 1e6:8.1f} us, x{single / batch:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(init_models())
+    check_equivalence()
+    bench()
+    bench_between()
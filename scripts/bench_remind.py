@@ -0,0 +1,106 @@
+"""
+提醒处理的单任务开销:
+1. 提前提醒设置的解析: JSON 字符串(旧格式) 与 位掩码 的对比
+2. fresh_email_remind 在内存 sqlite 上处理 n 个到期任务的总耗时、单任务耗时和内存峰值
+
+运行: python -m scripts.bench_remind
+"""
+import json
+import time
+import timeit
+import asyncio
+import argparse
+import datetime
+import tracemalloc
+from tortoise import Tortoise
+from app.models.models import User, ScheduledTask
+from app.worker import fresher
+from app import ulity
+
+ADVANCE_DAYS = [1, 2, 7]
+
+
+def legacy_tick(advance_days: str, advance_status: str) -> str:
+    """旧格式: 每次处理都解析 JSON 字符串，修改后再序列化"""
+    days = sorted(int(day) for day in json.loads(advance_days))
+    status = {int(k): v for k, v in json.loads(advance_status).items()}
+    for day in days:
+        if day not in status:
+            status[day] = False
+    for day in days:
+        if not status[day]:
+            status[day] = True
+            break
+    return json.dumps(status)
+
+
+def mask_tick(advance_days: int, advance_status: int) -> int:
+    """位掩码: 直接按位判断和修改"""
+    for day in ulity.iter_mask_days(advance_days & ~advance_status):
+        return advance_status | 1 << day
+    return advance_status
+
+
+def bench_decode(number: int = 100000):
+    days_json = json.dumps(ADVANCE_DAYS)
+    status_json = json.dumps({day: False for day in ADVANCE_DAYS})
+    days_mask = ulity.advance_days_mask(ADVANCE_DAYS)
+
+    assert json.loads(legacy_tick(days_json, status_json)) == {"1": True, "2": False, "7": False}
+    assert mask_tick(days_mask, 0) == ulity.advance_days_mask([1])
+
+    legacy = timeit.timeit(lambda: legacy_tick(days_json, status_json), number=number) / number
+    mask = timeit.timeit(lambda: mask_tick(days_mask, 0), number=number) / number
+    print(f"advance settings per task: json {legacy * 1e6:6.2f} us, mask {mask * 1e6:6.2f} us, x{legacy / mask:.1f}")
+
+
+async def seed(n: int):
+    user = await User.create(username="bench", password_hash="x", email="bench@example.com")
+    _now = ulity.now()
+    days_mask = ulity.advance_days_mask(ADVANCE_DAYS)
+    tasks = list()
+    for i in range(n):
+        # 提前提醒到期，正式提醒还没到
+        task_dt = _now + datetime.timedelta(hours=12 + i % 12)
+        tasks.append(ScheduledTask(
+            user=user,
+            name=f"task {i}",
+            message="message " * 50,
+            start_datetime=task_dt,
+            repeat_type="days",
+            repeat_interval=0,
+            repeat_times=-1,
+            advance_days_mask=days_mask,
+            current_task_datetime=task_dt,
+            advance_status_mask=0,
+            next_remind_at=_now - datetime.timedelta(minutes=1),
+        ))
+    await ScheduledTask.bulk_create(tasks, batch_size=1000)
+
+
+async def bench_remind(n: int):
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models.models"]}, use_tz=False, timezone="Asia/Shanghai")
+    try:
+        await Tortoise.generate_schemas()
+        await seed(n)
+        tracemalloc.start()
+        begin = time.perf_counter()
+        reminded = await fresher.fresh_email_remind()
+        seconds = time.perf_counter() - begin
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert reminded is not None and len(reminded) == n
+        print(
+            f"fresh_email_remind: {n} tasks {seconds:.2f} s, {seconds / n * 1e6:.0f} us/task, "
+            f"peak memory {peak / 1024 / 1024:.1f} MiB"
+        )
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=5000, help="到期任务数量")
+    args = parser.parse_args()
+    bench_decode()
+    asyncio.run(bench_remind(args.n))
@@ -0,0 +1,158 @@
+"""
+查询计划检查: 对路由和后台任务中的常用查询执行 EXPLAIN，出现全表扫描时返回非 0
+
+数据量很小时 MySQL 可能直接选择全表扫描，请在有实际数据量的库上运行:
+python -m scripts.check_query_plans
+python -m scripts.check_query_plans --db-url sqlite://:memory: --generate-schemas
+"""
+import sys
+import asyncio
+import argparse
+import datetime
+from tortoise import Tortoise, connections
+from tortoise.expressions import Q, F
+from tortoise.functions import Max, Count
+from tortoise.queryset import AwaitableQuery
+from app.models.models import SingleTask, ScheduledTask, MailOutbox, Session, User, TaskNameGram, Lease, ImportJob
+from app.routers.single_tasks import SINGLE_TASK_FIELDS, SINGLE_TASK_RELATED
+from app.routers.scheduled_tasks import SCHEDULED_TASK_FIELDS
+from app.worker.reminder import REMINDER_FIELDS
+from app.worker import fresher
+from app import pagination, lazy_tasks, ulity
+
+
+def query_shapes() -> dict[str, AwaitableQuery]:
+    """需要检查的查询，参数只用于生成 SQL"""
+    _now = ulity.now()
+    start_dt, end_dt = _now, _now + datetime.timedelta(days=30)
+    cursor = pagination.encode_cursor(_now, 1)
+    limit = pagination.DEFAULT_PAGE_SIZE + 1
+    single_tasks = SingleTask.filter(user_id=1, datetime__gte=start_dt, datetime__lt=end_dt)
+    due_reminders = ScheduledTask.filter(
+        Q(next_remind_at__lte=_now) | Q(next_remind_at__isnull=True),
+        is_ended=False,
+    )
+    return {
+        # routers/single_tasks.py
+        "single_tasks.search": single_tasks.order_by("datetime", "id").limit(limit).values(
+            *SINGLE_TASK_FIELDS, **SINGLE_TASK_RELATED
+        ),
+        "single_tasks.search is_done": single_tasks.filter(is_done=False).order_by("datetime", "id").limit(
+            limit
+        ).values(*SINGLE_TASK_FIELDS, **SINGLE_TASK_RELATED),
+        "single_tasks.search cursor": single_tasks.filter(pagination.after_cursor("datetime", cursor)).order_by(
+            "datetime", "id"
+        ).limit(limit).values(*SINGLE_TASK_FIELDS, **SINGLE_TASK_RELATED),
+        "single_tasks.done": SingleTask.filter(id=1, user_id=1),
+        # routers/scheduled_tasks.py
+        "scheduled_tasks.search": ScheduledTask.filter(user_id=1).order_by("start_datetime", "id").limit(
+            limit
+        ).values(*SCHEDULED_TASK_FIELDS),
+        "scheduled_tasks.search is_ended": ScheduledTask.filter(user_id=1, is_ended=False).order_by(
+            "start_datetime", "id"
+        ).limit(limit).values(*SCHEDULED_TASK_FIELDS),
+        # lazy_tasks.py
+        "lazy_tasks.rules": ScheduledTask.filter(
+            Q(is_ended=False) | Q(ended_at__gte=start_dt),
+            user_id=1,
+            start_datetime__lt=end_dt,
+        ).values(*lazy_tasks.RULE_FIELDS),
+        "lazy_tasks.overrides": single_tasks.filter(task_id__in=[1, 2, 3]).values(*lazy_tasks.OVERRIDE_FIELDS),
+        "lazy_tasks.materialize": SingleTask.filter(task_id=1, user_id=1, done_times=1).limit(1),
+        # name_search.py
+        "name_search.grams": TaskNameGram.filter(user_id=1, gram__in=["ab", "bc"]).annotate(
+            matched=Count("gram", distinct=True),
+        ).group_by("task_id").filter(matched__gte=2).values_list("task_id", flat=True),
+        "name_search.verify": ScheduledTask.filter(user_id=1, name__icontains="abc", id__in=[1, 2, 3]),
+        "single_tasks.search task_name": single_tasks.filter(task_id__in=[1, 2, 3]).order_by("datetime", "id").limit(
+            limit
+        ).values(*SINGLE_TASK_FIELDS, **SINGLE_TASK_RELATED),
+        # routers/login.py
+        "login": User.filter(username="username").limit(1),
+        # sessions.py
+        "session.get": Session.filter(id="session_id").limit(1),
+        "session.sweep": Session.filter(expires_at__lte=_now),
+        # models.py ScheduledTask.generate_single_tasks
+        "generate_single_tasks.last": SingleTask.filter(task_id=1).order_by("-datetime").limit(1),
+        # worker/fresher.py
+        "fresh_email_remind": due_reminders.values(*REMINDER_FIELDS),
+        # 分片处理: id % n = i
+        "fresh_email_remind shard": fresher.shard_filter(due_reminders, (0, 4)).values(*REMINDER_FIELDS),
+        "fresh_email_remind.messages": ScheduledTask.filter(id__in=[1, 2, 3]).values_list("id", "message"),
+        "fresh_single_tasks.tasks": ScheduledTask.filter(is_ended=False, id__gt=1).order_by("id").limit(500),
+        "fresh_single_tasks.lasts": SingleTask.filter(task_id__in=[1, 2, 3]).annotate(
+            last_datetime=Max("datetime"),
+            last_done_times=Max("done_times"),
+        ).group_by("task_id").values("task_id", "last_datetime", "last_done_times"),
+        "fail_stale_import_jobs": ImportJob.filter(
+            status__in=("pending", "running"), updated_at__lt=_now,
+        ).values("id", "errors"),
+        # worker/timer.py RemindTimer.load / poll
+        "remind_timer.load": fresher.shard_filter(ScheduledTask.filter(
+            Q(next_remind_at__lte=_now) | Q(next_remind_at__isnull=True),
+            is_ended=False,
+        ), (0, 4)).values_list("id", "next_remind_at"),
+        # worker/leader.py LeaderLease.try_acquire
+        "lease.renew": Lease.filter(
+            Q(holder="holder") | Q(expires_at__lt=_now),
+            name="scheduler",
+        ).update(holder="holder", expires_at=_now),
+        # worker/outbox.py，SQLite 不支持 FOR UPDATE，生成的 SQL 中没有锁
+        "outbox.claim": MailOutbox.filter(
+            Q(status="pending") | Q(status="sending"),
+            next_attempt_at__lte=_now,
+        ).order_by("next_attempt_at").limit(100).select_for_update(skip_locked=True),
+        "outbox.claim update": MailOutbox.filter(id__in=[1, 2, 3]).update(
+            status="sending",
+            attempts=F("attempts") + 1,
+            next_attempt_at=_now,
+        ),
+        "outbox.purge": MailOutbox.filter(status="sent", sent_at__lt=_now),
+    }
+
+
+def full_scans(dialect: str, plan: list[dict]) -> list[str]:
+    """返回执行计划中全表扫描的表"""
+    if dialect == "mysql":
+        return [row["table"] for row in plan if row.get("type") == "ALL"]
+    if dialect == "sqlite":
+        # SCAN table 为全表扫描; SCAN table USING INDEX 为按索引顺序扫描
+        return [row["detail"] for row in plan if row["detail"].startswith("SCAN") and "INDEX" not in row["detail"]]
+    raise ValueError(f"unsupported dialect: {dialect}")
+
+
+async def explain(query: AwaitableQuery) -> list[dict]:
+    conn = connections.get("default")
+    prefix = "EXPLAIN QUERY PLAN" if conn.capabilities.dialect == "sqlite" else "EXPLAIN"
+    return await conn.execute_query_dict(f"{prefix} {query.sql(params_inline=True)}")
+
+
+async def main(db_url: str = None, generate_schemas: bool = False) -> int:
+    if db_url:
+        await Tortoise.init(db_url=db_url, modules={"models": ["app.models.models"]}, use_tz=False, timezone="Asia/Shanghai")
+    else:
+        from app.models.mysql_config import MYSQL_TORTOISE_ORM
+        await Tortoise.init(config=MYSQL_TORTOISE_ORM)
+    try:
+        if generate_schemas:
+            await Tortoise.generate_schemas()
+        dialect = connections.get("default").capabilities.dialect
+        failed = 0
+        for name, query in query_shapes().items():
+            scans = full_scans(dialect, await explain(query))
+            if scans:
+                failed += 1
+                print(f"FULL SCAN  {name}: {', '.join(scans)}")
+            else:
+                print(f"ok         {name}")
+        return 1 if failed else 0
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db-url", default=None, help="默认使用 .env 中的 MySQL 配置")
+    parser.add_argument("--generate-schemas", action="store_true", help="先建表，用于空的测试库")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.db_url, args.generate_schemas)))
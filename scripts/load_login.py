@@ -0,0 +1,80 @@
+"""
+登录压测: 并发登录的同时测量 /single_tasks/search 的延迟
+
+先启动服务，然后运行:
+python -m scripts.load_login --base-url http://127.0.0.1:8002 --logins 200 --concurrency 50
+"""
+import time
+import uuid
+import asyncio
+import argparse
+import datetime
+import httpx
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(int(len(values) * p / 100), len(values) - 1)
+    return values[index]
+
+
+async def login_worker(client: httpx.AsyncClient, username: str, password: str, count: int, statuses: dict):
+    for _ in range(count):
+        response = await client.post("/login/", json={"username": username, "password": password})
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def search_worker(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list[float]):
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    while not stop.is_set():
+        begin = time.perf_counter()
+        response = await client.get("/single_tasks/search", params={"start_date": today, "end_date": today})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - begin)
+        await asyncio.sleep(0.05)
+
+
+async def main(base_url: str, logins: int, concurrency: int):
+    username, password = f"load-{uuid.uuid4().hex[:8]}", uuid.uuid4().hex
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        (await client.post("/register/", json={"username": username, "password": password})).raise_for_status()
+        (await client.post("/login/", json={"username": username, "password": password})).raise_for_status()
+
+        # 空载延迟
+        idle, stop = list(), asyncio.Event()
+        task = asyncio.create_task(search_worker(client, stop, idle))
+        await asyncio.sleep(3)
+        stop.set()
+        await task
+
+        # 并发登录时的延迟
+        busy, stop, statuses = list(), asyncio.Event(), dict()
+        task = asyncio.create_task(search_worker(client, stop, busy))
+        per_worker = max(logins // concurrency, 1)
+        begin = time.perf_counter()
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as login_client:
+            await asyncio.gather(*(
+                login_worker(login_client, username, password, per_worker, statuses)
+                for _ in range(concurrency)
+            ))
+        elapsed = time.perf_counter() - begin
+        stop.set()
+        await task
+
+    print(f"logins: {per_worker * concurrency} in {elapsed:.1f}s, status codes: {statuses}")
+    for name, latencies in (("idle", idle), ("during logins", busy)):
+        print(
+            f"/single_tasks/search {name:>14}: n={len(latencies)}, "
+            f"p50={percentile(latencies, 50) * 1000:.1f}ms, p99={percentile(latencies, 99) * 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8002")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.base_url, args.logins, args.concurrency))